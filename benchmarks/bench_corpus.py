@@ -0,0 +1,47 @@
+"""Throughput and accuracy of decode_signal, and of decode_digital for digital
+signals, over impaired corpora, and the rate corpora are made at.
+
+    python -m benchmarks.bench_corpus
+"""
+import time
+
+from irig.corpus import Impairments, make_corpus, score
+from irig.decode import decode_digital, decode_signal
+
+FRAMES = 300
+SEED = 1
+
+PRESETS = [
+    ('clean', Impairments()),
+    ('noise', Impairments(noise=0.2)),
+    ('drift', Impairments(drift=0.3)),
+    ('jitter', Impairments(jitter=5e-5)),
+    ('rate', Impairments(rate_offset=1e-3)),
+    ('dropouts', Impairments(dropouts=0.1)),
+    ('glitches', Impairments(glitches=1)),
+    ('all', Impairments(noise=0.1, drift=0.1, jitter=2e-5, rate_offset=1e-4, dropouts=0.02, glitches=0.2)),
+]
+
+DECODERS = [
+    ('digital', 'digital', lambda signal: decode_signal(signal, 'digital')),
+    ('robust', 'digital', lambda signal: decode_digital(signal)[:3]),
+    ('analog', 'analog', lambda signal: decode_signal(signal, 'analog')),
+]
+
+
+def main():
+    for decoder, kind, decode in DECODERS:
+        for name, impairments in PRESETS:
+            start = time.perf_counter()
+            corpus = make_corpus(FRAMES, SEED, kind, impairments=impairments)
+            made = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result = score(corpus, *decode(corpus.signal))
+            elapsed = time.perf_counter() - start
+            print('%-7s %-9s %6.1f%% decoded %3d wrong   decode %7.0fx real time   made at %5.0fx real time' % (
+                decoder, name, 100 * result.decoded / FRAMES, result.wrong, FRAMES / elapsed, FRAMES / made))
+
+
+if __name__ == '__main__':
+    main()
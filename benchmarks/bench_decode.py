@@ -0,0 +1,79 @@
+"""Decoder throughput, as a multiple of real time and in frames per second on one core.
+
+    python -m benchmarks.bench_decode
+"""
+import time
+import timeit
+
+import numpy as np
+
+from irig.decode import AnalogDecoder, DigitalDecoder, decode_edges, edges, from_bits_many, sbs_many
+from irig.frame import IrigFrame
+from irig.metrics import DecoderMetrics
+from irig.render import encode_range, symbols
+from irig.utilities import irigtime
+
+SECONDS = 300
+BLOCK = 4096
+
+
+def realtime_factor(decoder, signal):
+    start = time.perf_counter()
+    frames = 0
+    for i in range(0, len(signal), BLOCK):
+        frames += len(decoder.feed(signal[i:i+BLOCK]))
+    elapsed = time.perf_counter() - start
+    assert frames == SECONDS - 1
+    return SECONDS / elapsed
+
+
+def strptime_from_bits(bits):
+    """The original strptime based irigtime.from_bits"""
+    second = str(int(bits[6:9], 2)) + str(int(bits[1:5], 2))
+    minute = str(int(bits[15:18], 2)) + str(int(bits[10:14], 2))
+    hour = str(int(bits[25:27], 2)) + str(int(bits[20:24], 2))
+    day_of_year = str(int(bits[40:42], 2)) + str(int(bits[35:39], 2)) + str(int(bits[30:34], 2))
+    year = '20' + str(int(bits[55:59], 2)) + str(int(bits[50:54], 2))
+    return irigtime.strptime(' '.join([year, day_of_year, hour, minute, second]), '%Y %j %H %M %S')
+
+
+def frames_per_second(function, number):
+    return number / min(timeit.repeat(function, number=1, repeat=5))
+
+
+def main():
+    start = irigtime(2016, 7, 20, 1, 49)
+    cases = [
+        ('digital', DigitalDecoder, encode_range(start, SECONDS, 'digital', flat=True)),
+        ('analog', AnalogDecoder, encode_range(start, SECONDS, 'analog', flat=True)),
+    ]
+    for name, decoder, signal in cases:
+        print('%-11s %8.0fx real time' % (name, realtime_factor(decoder(), signal)))
+        print('%-11s %8.0fx real time' % ('  untracked', realtime_factor(decoder(tracking=False), signal)))
+        print('%-11s %8.0fx real time' % ('  metrics', realtime_factor(decoder(metrics=DecoderMetrics()), signal)))
+
+    # A 1 MHz logic analyzer capture, decoded from samples and from edge timestamps
+    capture = np.repeat(cases[0][2].astype(np.int8), 1000)
+    rising, falling = edges(capture)
+    for name, function in [('edges 1 MHz', lambda: decode_edges(*edges(capture))),
+                           ('edge times', lambda: decode_edges(rising, falling))]:
+        assert len(function()[0]) == SECONDS - 1
+        print('%-11s %8.0fx real time' % (name, SECONDS / min(timeit.repeat(function, number=1, repeat=3))))
+
+    bits = start.bits
+    frame = IrigFrame.from_bits(bits)
+    frames = np.tile(symbols(bits), (10000, 1))
+    cases = [
+        ('strptime', lambda: [strptime_from_bits(bits) for i in range(1000)], 1000),
+        ('from_bits', lambda: [irigtime.from_bits(bits) for i in range(1000)], 1000),
+        ('from_bits_many', lambda: from_bits_many(frames), len(frames)),
+        ('sbs_from_bits', lambda: [irigtime.sbs_from_bits(bits) for i in range(1000)], 1000),
+        ('IrigFrame.sbs', lambda: [frame.sbs for i in range(1000)], 1000),
+        ('sbs_many', lambda: sbs_many(frames), len(frames)),
+    ]
+    for name, function, number in cases:
+        print('%-15s %10.0f frames/s' % (name, frames_per_second(function, number)))
+
+
+if __name__ == '__main__':
+    main()
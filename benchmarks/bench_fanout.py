@@ -0,0 +1,53 @@
+"""Throughput of rendering a timecode to many channels, with FanoutRenderer
+and by rendering each channel on its own.
+
+    python -m benchmarks.bench_fanout
+"""
+import time
+
+import numpy as np
+
+from irig.fanout import FanoutRenderer
+from irig.formats import IRIG_B
+from irig.render import encode_range
+from irig.utilities import irigtime
+
+SECONDS = 60
+BLOCK = 4096
+START = irigtime(2016, 7, 20, 1, 49)
+SAMPLES = SECONDS * IRIG_B.sample_rate('analog')
+
+
+def separate(delays, gains):
+    """Each channel rendered on its own, then shifted and scaled"""
+    for delay, gain in zip(delays, gains):
+        signal = encode_range(START, SECONDS + 1, 'analog')
+        shift = int(np.floor(delay))
+        np.rint(signal.ravel()[shift:shift + SAMPLES] * gain)
+
+
+def fanout(delays, gains, layout, dtype=None):
+    renderer = FanoutRenderer(START, delays, gains, layout=layout, dtype=dtype)
+    for i in range(SAMPLES // BLOCK):
+        renderer.read(BLOCK)
+
+
+def main():
+    rng = np.random.default_rng(1)
+    for channels in (1, 4, 16, 64):
+        delays = rng.uniform(0, 100, channels)
+        gains = rng.uniform(0.5, 1, channels)
+        cases = [('separate', lambda: separate(delays, gains)),
+                 ('planar', lambda: fanout(delays, gains, 'planar')),
+                 ('interleaved', lambda: fanout(delays, gains, 'interleaved')),
+                 ('float32', lambda: fanout(delays, gains, 'planar', np.float32)),
+                 ('whole delays', lambda: fanout(np.floor(delays), np.ones(channels), 'planar'))]
+        for name, run in cases:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print('%3d channels  %-13s %7.0fx real time' % (channels, name, SECONDS / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Cold start time of importing the package, in fresh interpreters.
+
+Importing irig must not import the heavy dependencies, which are only loaded
+when the modules that need them are first used. Exits with an error if it does.
+
+    python -m benchmarks.bench_import
+"""
+import os
+import subprocess
+import sys
+
+REPEAT = 5
+HEAVY = ('numpy', 'myhdl', 'asyncio', 'concurrent.futures')
+
+CASES = [
+    ('python', 'pass'),
+    ('import irig', 'import irig; irig.irigtime'),
+    ('irig.decode', 'import irig; irig.DigitalDecoder'),
+    ('irig.hardware', 'import irig; irig.hardware'),
+]
+
+
+def cold_start(code):
+    """Best of REPEAT wall times of running code in a new interpreter, and the heavy modules it imported"""
+    script = ('import sys, time; start = time.perf_counter(); %s; elapsed = time.perf_counter() - start; '
+              'print(elapsed, *[name for name in %r if name in sys.modules])' % (code, HEAVY))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best, heavy = None, []
+    for i in range(REPEAT):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=root, check=True).stdout.split()
+        best = min(best or float(output[0]), float(output[0]))
+        heavy = output[1:]
+    return best, heavy
+
+
+def main():
+    for name, code in CASES:
+        elapsed, heavy = cold_start(code)
+        print('%-14s %7.1f ms   %s' % (name, elapsed * 1e3, ' '.join(heavy)))
+        if name == 'import irig' and heavy:
+            sys.exit('import irig loaded ' + ', '.join(heavy))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Per-frame cost of rendering IRIG signals one sample at a time versus with
+the NumPy template renderer (irigtime.digital_array / irigtime.analog_array).
+
+    python -m benchmarks.bench_render
+"""
+import timeit
+
+from irig.formats import IRIG_A, IRIG_G
+from irig.utilities import (irigtime, PULSE_WIDTH, BIT_WIDTH, TTL_AMP,
+                            LARGE_WAVE, SMALL_WAVE)
+
+
+def digital_samples(frame):
+    """The original per-sample digital generator"""
+    for bit in frame.bits:
+        for i in range(PULSE_WIDTH):
+            yield TTL_AMP if i < BIT_WIDTH[bit] else 0
+
+
+def analog_samples(frame):
+    """The original per-sample analog generator"""
+    for bit in digital_samples(frame):
+        for x in (LARGE_WAVE if bit else SMALL_WAVE):
+            yield x
+
+
+def per_frame(stmt, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5)) / number
+
+
+def main():
+    frame = irigtime(2016, 7, 20, 1, 49)
+    cases = [
+        ('digital', lambda: list(digital_samples(frame)),
+         lambda: frame.digital_array('int16')),
+        ('analog', lambda: list(analog_samples(frame)),
+         lambda: frame.analog_array('float32')),
+    ]
+    for name, generator, array in cases:
+        array()  # build the cached templates
+        before = per_frame(generator, 20)
+        after = per_frame(array, 200)
+        print('%-8s generator %9.1f us/frame   array %7.1f us/frame   %6.1fx' %
+              (name, before * 1e6, after * 1e6, before / after))
+
+    for timecode in (IRIG_A.with_sample_freq(44100), IRIG_A.with_sample_freq(192000),
+                     IRIG_G.with_sample_freq(1000000)):
+        # A new format instance has to build its templates again
+        uncached = per_frame(lambda: frame.analog_array(
+            timecode=timecode.with_sample_freq(timecode.sample_freq)), 20)
+        cached = per_frame(lambda: frame.analog_array(timecode=timecode), 200)
+        print('IRIG-%s at %7d Hz  uncached %7.1f us/frame   cached %7.1f us/frame' %
+              (timecode.name, timecode.sample_freq, uncached * 1e6, cached * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""IRIG timecode generation and decoding.
+
+irigtime and the signal constants are imported with the package. Everything
+else, including the NumPy based modules and the MyHDL hardware designs, is
+imported on first access, so importing irig alone stays cheap:
+
+>>> import os, subprocess, sys
+>>> code = 'import irig, sys; irig.irigtime, irig.SAMPLE_FREQ; print(sorted(set(sys.modules) & {"numpy", "myhdl", "asyncio"}))'
+>>> root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+>>> subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=root).stdout
+'[]\\n'
+>>> import irig
+>>> irig.IrigFrame.__name__, irig.render.__name__
+('IrigFrame', 'irig.render')
+"""
+import importlib
+
+from irig.utilities import (irigtime, TTL_AMP, AM_LARGE_AMP, AM_SMALL_AMP, PULSE_WIDTH, BIT_WIDTH,
+                            CARRIER_FREQ, SAMPLE_FREQ, SAMPLES, NUM_FRAME_BITS, SYMBOLS)
+
+# Module of each lazily imported name
+_LAZY = {
+    'encode_range': 'irig.render',
+    'DigitalDecoder': 'irig.decode',
+    'AnalogDecoder': 'irig.decode',
+    'decode_edges': 'irig.decode',
+    'DecoderMetrics': 'irig.metrics',
+    'IrigFrame': 'irig.frame',
+    'TimecodeFormat': 'irig.formats',
+    'FORMATS': 'irig.formats',
+    'IRIG_A': 'irig.formats',
+    'IRIG_B': 'irig.formats',
+    'IRIG_D': 'irig.formats',
+    'IRIG_E': 'irig.formats',
+    'IRIG_G': 'irig.formats',
+    'IRIG_H': 'irig.formats',
+    'write_signal': 'irig.recording',
+    'RealtimeSource': 'irig.realtime',
+    'FanoutRenderer': 'irig.fanout',
+    'decode_files': 'irig.bulk',
+    'FrameIndex': 'irig.index',
+}
+
+_SUBMODULES = ('bulk', 'corpus', 'decode', 'fanout', 'formats', 'frame', 'hardware', 'index', 'metrics',
+               'model', 'ontime', 'realtime', 'recording', 'render', 'utilities')
+
+__all__ = ['irigtime', 'TTL_AMP', 'AM_LARGE_AMP', 'AM_SMALL_AMP', 'PULSE_WIDTH', 'BIT_WIDTH',
+           'CARRIER_FREQ', 'SAMPLE_FREQ', 'SAMPLES', 'NUM_FRAME_BITS', 'SYMBOLS'] + list(_LAZY)
+
+
+def __getattr__(name):
+    """Import lazy names and submodules on first access (PEP 562)"""
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module('irig.' + name)
+    else:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__) | set(_SUBMODULES))
@@ -0,0 +1,151 @@
+"""Decoding of archives of recorded IRIG captures on a process pool.
+
+Files are split into chunks of whole frames, and the chunks of all files are
+decoded in parallel. Each chunk is read with an overlap of a frame on either
+side and keeps only the frames that start inside it, so frames that straddle
+a chunk boundary are decoded exactly once.
+
+    python -m irig.bulk capture1.wav capture2.wav --workers 8 --output times.csv
+"""
+import argparse
+import math
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from irig.decode import decode_signal
+from irig.formats import FORMATS, IRIG_B
+from irig.recording import read_signal
+
+CHUNK_FRAMES = 600  # Frames per chunk of a file
+
+# Row of the table of decoded frames
+FRAME_DTYPE = np.dtype([('offset', '<i8'), ('time', '<M8[s]'), ('flags', 'u1')])
+
+
+class FileResult(namedtuple('FileResult', 'path frames seconds elapsed')):
+    """The decoded frames of a file.
+
+      frames  : FRAME_DTYPE array of the sample offset, time and quality flags of each frame
+      seconds : duration of the signal in the file
+      elapsed : seconds the workers spent decoding the file
+    """
+    __slots__ = ()
+
+    @property
+    def throughput(self):
+        """Seconds of signal decoded per second of worker time"""
+        return self.seconds / self.elapsed if self.elapsed else float('inf')
+
+
+def _decode_chunk(task):
+    """Decode the frames of a file that start between two sample offsets"""
+    path, start, stop, frame_length, margin, kind, dtype, sample_rate, channel, timecode = task
+    began = time.perf_counter()
+    signal, rate = read_signal(path, kind, dtype, sample_rate, channel, timecode)
+    if kind == 'analog' and rate != timecode.sample_freq:
+        timecode = timecode.with_sample_freq(rate)
+
+    # Chunks start on frames, which are whole carrier cycles of an analog signal
+    first = max(0, start - frame_length)
+    offsets, times, flags = decode_signal(np.asarray(signal[first:stop + margin]), kind, timecode)
+
+    offsets = offsets + first
+    keep = (offsets >= start) & (offsets < stop)
+    table = np.empty(np.count_nonzero(keep), dtype=FRAME_DTYPE)
+    table['offset'], table['time'], table['flags'] = offsets[keep], times[keep], flags[keep]
+    return table, time.perf_counter() - began
+
+
+def _tasks(path, kind, dtype, sample_rate, channel, timecode, chunk_frames):
+    """Returns the chunks of a file, and the duration of its signal"""
+    signal, rate = read_signal(path, kind, dtype, sample_rate, channel, timecode)
+    frame_length = math.ceil(rate * timecode.frame_duration)
+    step = frame_length * chunk_frames
+    margin = frame_length + 2 * math.ceil(frame_length / timecode.num_bits)
+    tasks = [(path, start, min(start + step, len(signal)), frame_length, margin,
+              kind, dtype, sample_rate, channel, timecode) for start in range(0, len(signal), step)]
+    return tasks, len(signal) / rate
+
+
+def decode_files(paths, workers=None, kind='digital', dtype=None, sample_rate=None,
+                 channel=0, timecode=IRIG_B, chunk_frames=CHUNK_FRAMES):
+    """Decode the frames of recorded captures in parallel.
+
+    Files are read with recording.read_signal, as WAV files or as raw samples
+    of dtype at sample_rate. Digital captures may be at any sample rate.
+    workers is the number of processes, all cores by default, and 1 decodes
+    in this process.
+
+    Returns a FileResult for each path, in order.
+
+    >>> import os, tempfile
+    >>> from irig.recording import write_signal
+    >>> from irig.utilities import irigtime
+    >>> path = os.path.join(tempfile.mkdtemp(), 'irig.wav')
+    >>> write_signal(path, irigtime(2016, 7, 20, 1, 49), 5, dtype='int16')
+    5
+    >>> result, = decode_files([path], workers=1, kind='analog', chunk_frames=2)
+    >>> result.frames['time']
+    array(['2016-07-20T01:49:01', '2016-07-20T01:49:02',
+           '2016-07-20T01:49:03', '2016-07-20T01:49:04'],
+          dtype='datetime64[s]')
+    >>> result.frames['offset'].tolist()
+    [32000, 64000, 96000, 128000]
+    """
+    tasks, chunks, seconds = [], [], []
+    for path in paths:
+        file_tasks, duration = _tasks(path, kind, dtype, sample_rate, channel, timecode, chunk_frames)
+        tasks.extend(file_tasks)
+        chunks.append(len(file_tasks))
+        seconds.append(duration)
+
+    if workers == 1:
+        results = list(map(_decode_chunk, tasks))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(_decode_chunk, tasks))
+
+    files, first = [], 0
+    for path, count, duration in zip(paths, chunks, seconds):
+        tables, elapsed = zip(*results[first:first + count]) if count else ((), ())
+        first += count
+        frames = np.concatenate(tables) if tables else np.empty(0, dtype=FRAME_DTYPE)
+        files.append(FileResult(path, frames, duration, sum(elapsed)))
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m irig.bulk', description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='+', help='WAV or raw capture files')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes, all cores by default')
+    parser.add_argument('--kind', choices=('digital', 'analog'), default='digital')
+    parser.add_argument('--dtype', default=None, help='sample type of raw files')
+    parser.add_argument('--rate', type=int, default=None, help='sample rate of raw files')
+    parser.add_argument('--channel', type=int, default=0, help='channel of multichannel WAV files')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='B', help='IRIG timecode format')
+    parser.add_argument('--output', help='write the decoded frames to this CSV file')
+    args = parser.parse_args(argv)
+
+    results = decode_files(args.paths, args.workers, args.kind, args.dtype, args.rate,
+                           args.channel, FORMATS[args.format])
+    for result in results:
+        frames = result.frames
+        span = '%s .. %s' % (frames['time'][0], frames['time'][-1]) if len(frames) else '-'
+        print('%s: %d frames, %d flagged, %s, %.0fx real time' % (
+            result.path, len(frames), np.count_nonzero(frames['flags']), span, result.throughput),
+            file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write('path,offset,time,flags\n')
+            for result in results:
+                for offset, t, flags in result.frames.tolist():
+                    f.write('%s,%d,%s,%d\n' % (result.path, offset, '' if t is None else t.isoformat(), flags))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Reproducible corpora of impaired IRIG signals, for benchmarking decoders.
+
+A corpus is a run of frames at random times, rendered in a timecode format and
+passed through the impairments of a real capture. Everything is drawn from one
+seeded random generator, a chunk of frames at a time, so the same parameters
+always give the same corpus, and corpora of millions of frames are written to
+disk without holding them in memory.
+
+On disk a corpus is a directory of .npy files, which are opened as memory maps:
+
+    signal.npy   the samples
+    times.npy    the time of each frame (datetime64[s])
+    offsets.npy  the sample offset each frame starts at
+    corpus.json  the parameters it was made with
+
+    python -m irig.corpus corpus/ --frames 1000000 --kind analog --noise 0.1 --jitter 0.0001
+"""
+import argparse
+import json
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from irig.formats import FORMATS, IRIG_B
+from irig.utilities import AM_LARGE_AMP, BCD_FIELDS, BINARY_FIELDS, SYMBOLS, TTL_AMP
+
+CHUNK_FRAMES = 600        # Frames rendered at a time
+DRIFT_PERIOD = 10         # Seconds per cycle of the amplitude drift
+DROPOUT_DURATION = 0.01   # Seconds of silence of a dropout
+FIRST_YEAR, LAST_YEAR = 2000, 2099
+
+# Straight binary seconds positions, least significant bit first
+_SBS_POSITIONS = [index + bit for index, width in BINARY_FIELDS['sbs'] for bit in range(width)]
+
+
+class Impairments(namedtuple('Impairments', 'noise drift jitter rate_offset dropouts glitches')):
+    """The impairments applied to a corpus, all off by default.
+
+      noise       : standard deviation of additive Gaussian noise, relative to the amplitude of the signal
+      drift       : peak relative change of the amplitude, a sine over DRIFT_PERIOD seconds
+      jitter      : standard deviation of the timing of each bit, in seconds
+      rate_offset : relative error of the sample rate, eg 1e-4 samples 100 ppm fast
+      dropouts    : mean number of dropouts (DROPOUT_DURATION of silence) per second
+      glitches    : mean number of glitches per second, single samples of the opposite
+                    level (digital) or a full scale spike (analog)
+    """
+    __slots__ = ()
+
+Impairments.__new__.__defaults__ = (0.0,) * len(Impairments._fields)
+
+
+class Corpus(namedtuple('Corpus', 'signal times offsets sample_rate')):
+    """Samples of a corpus, with the time and start offset of each of its frames"""
+    __slots__ = ()
+
+
+class Score(namedtuple('Score', 'decoded wrong missed')):
+    """Accuracy of a decoder over a corpus.
+
+      decoded : frames decoded with the right time, within half a bit of their offset
+      wrong   : unflagged frames with the wrong time or offset
+      missed  : frames of the corpus that were not decoded
+    """
+    __slots__ = ()
+
+
+def frame_codes(times, num_bits=100):
+    """Symbol codes of the frames of an array of datetime64 times, as a
+    (frames, num_bits) array
+    >>> from irig.utilities import irigtime
+    >>> codes = frame_codes(np.array(['2016-07-20T01:49:37'], dtype='M8[s]'))
+    >>> ''.join(SYMBOLS[code] for code in codes[0]) == irigtime(2016, 7, 20, 1, 49, 37).bits
+    True
+    """
+    times = np.asarray(times, dtype='M8[s]')
+    days = times.astype('M8[D]')
+    years = days.astype('M8[Y]')
+    seconds = (times - days).astype(np.int64)
+    values = {
+        'second': seconds % 60,
+        'minute': seconds // 60 % 60,
+        'hour': seconds // 3600,
+        'day_of_year': (days - years).astype(np.int64) + 1,
+        'year': (years.astype(np.int64) + 1970) % 100,
+    }
+
+    codes = np.zeros((len(times), 100), dtype=np.uint8)
+    for name, value in values.items():
+        for index, width in BCD_FIELDS[name]:
+            value, digit = np.divmod(value, 10)
+            for bit in range(width):
+                codes[:, index + bit] = (digit >> (width - 1 - bit)) & 1
+    for weight, position in enumerate(_SBS_POSITIONS):
+        codes[:, position] = (seconds >> weight) & 1
+    positions = np.arange(100)
+    codes[:, (positions == 0) | (positions % 10 == 9)] = SYMBOLS.index('_')
+    return codes[:, :num_bits]
+
+
+def random_times(count, rng, timecode=IRIG_B, consecutive=True):
+    """The times of count frames from the years FIRST_YEAR to LAST_YEAR, those
+    of consecutive frames from a random start, or each drawn at random"""
+    first = np.datetime64('%d-01-01' % FIRST_YEAR, 's').astype(np.int64)
+    last = np.datetime64('%d-01-01' % (LAST_YEAR + 1), 's').astype(np.int64)
+    if not consecutive:
+        return rng.integers(first, last, count).astype('M8[s]')
+    duration = timecode.frame_duration
+    span = count * duration.numerator // duration.denominator
+    start = rng.integers(first, last - span)
+    return (start + np.arange(count) * duration.numerator // duration.denominator).astype('M8[s]')
+
+
+def render_frames(codes, kind='digital', timecode=IRIG_B):
+    """Render a (frames, num_bits) array of symbol codes to float samples, one row per frame"""
+    if kind == 'digital':
+        templates = timecode.digital_templates('float64')
+    else:
+        templates = timecode.analog_templates('float64')
+    if templates is not None:
+        return templates[codes].reshape(len(codes), -1)
+    frame = timecode.analog_frame_templates('float64')
+    return frame[codes[:, timecode.sample_bits], np.arange(timecode.frame_samples)]
+
+
+def _convert(wave, kind, dtype):
+    """Convert float samples to dtype. Integer analog samples are scaled so that
+    AM_LARGE_AMP is full scale, and samples out of range are clipped"""
+    if dtype.kind in 'iu':
+        info = np.iinfo(dtype)
+        if kind == 'analog':
+            wave = wave * (info.max / AM_LARGE_AMP)
+        wave = np.clip(np.rint(wave), info.min, info.max)
+    return wave.astype(dtype)
+
+
+def _plan(count, seed, kind, timecode, impairments, consecutive):
+    """The random generator, frame times, frame offsets and length of a corpus"""
+    rng = np.random.default_rng(seed)
+    times = random_times(count, rng, timecode, consecutive)
+    stretch = 1 + impairments.rate_offset
+    frame_length = timecode.frame_length(kind)
+    offsets = np.ceil(np.arange(count) * (frame_length * stretch)).astype(np.int64)
+    return rng, times, offsets, int(count * frame_length * stretch)
+
+
+def _render(out, rng, times, offsets, kind, timecode, impairments, chunk_frames):
+    """Render the impaired signal of the frames at times into out, a chunk of frames at a time"""
+    count = len(times)
+    frame_length = timecode.frame_length(kind)
+    rate = timecode.sample_rate(kind)
+    amplitude = TTL_AMP if kind == 'digital' else AM_LARGE_AMP
+    stretch = 1 + impairments.rate_offset
+    phase = rng.uniform(0, 2 * np.pi)
+
+    for a in range(0, count, chunk_frames):
+        b = min(a + chunk_frames, count)
+        start, stop = offsets[a], offsets[b] if b < count else len(out)
+
+        # Render a frame either side, for samples that jitter out of the chunk
+        lo, hi = max(a - 1, 0), min(b + 1, count)
+        clean = render_frames(frame_codes(times[lo:hi], timecode.num_bits), kind, timecode).ravel()
+        base = lo * frame_length
+
+        samples = np.arange(start, stop)
+        if impairments.jitter or impairments.rate_offset:
+            # Resample the clean signal at the times of the impaired samples,
+            # with the same timing error across each bit
+            position = samples / stretch
+            if impairments.jitter:
+                bits = np.clip((position * timecode.num_bits / frame_length).astype(np.int64)
+                               - a * timecode.num_bits, 0, (b - a) * timecode.num_bits - 1)
+                errors = rng.normal(0, impairments.jitter * rate, (b - a) * timecode.num_bits)
+                position = position + errors[bits]
+            index = np.clip(np.floor(position).astype(np.int64) - base, 0, len(clean) - 2)
+            wave = clean[index]
+            if kind == 'analog':
+                fraction = np.clip(position - base - index, 0, 1)
+                wave = wave + fraction * (clean[index + 1] - wave)
+        else:
+            wave = clean[start - base:stop - base].copy()
+
+        if impairments.drift:
+            wave *= 1 + impairments.drift * np.sin(2 * np.pi * samples / (rate * DRIFT_PERIOD) + phase)
+        if impairments.dropouts:
+            length = max(1, int(DROPOUT_DURATION * rate))
+            for at in rng.integers(0, len(wave), rng.poisson(impairments.dropouts * len(wave) / rate)):
+                wave[at:at + length] = 0
+        if impairments.glitches:
+            at = rng.integers(0, len(wave), rng.poisson(impairments.glitches * len(wave) / rate))
+            if kind == 'digital':
+                wave[at] = amplitude - wave[at]
+            else:
+                wave[at] = amplitude * rng.choice((-1, 1), len(at))
+        if impairments.noise:
+            wave += rng.normal(0, impairments.noise * amplitude, len(wave))
+
+        out[start:stop] = _convert(wave, kind, out.dtype)
+
+
+def make_corpus(count, seed=0, kind='digital', dtype=None, timecode=IRIG_B, impairments=Impairments(),
+                consecutive=True, chunk_frames=CHUNK_FRAMES):
+    """Returns a Corpus of count frames, in memory.
+
+    Without impairments the signal is that of render.encode_range:
+
+    >>> from irig.decode import decode_signal
+    >>> from irig.render import encode_range
+    >>> from irig.utilities import irigtime
+    >>> corpus = make_corpus(5, seed=1)
+    >>> start = irigtime(*corpus.times[0].item().timetuple()[:6])
+    >>> np.array_equal(corpus.signal, encode_range(start, 5, flat=True))
+    True
+    >>> corpus = make_corpus(20, seed=1, kind='analog', impairments=Impairments(noise=0.2, jitter=2e-5))
+    >>> score(corpus, *decode_signal(corpus.signal, 'analog'))
+    Score(decoded=19, wrong=0, missed=1)
+    """
+    dtype = timecode.dtype(kind, dtype)
+    rng, times, offsets, length = _plan(count, seed, kind, timecode, impairments, consecutive)
+    signal = np.empty(length, dtype=dtype)
+    _render(signal, rng, times, offsets, kind, timecode, impairments, chunk_frames)
+    return Corpus(signal, times, offsets, timecode.sample_rate(kind))
+
+
+def write_corpus(path, count, seed=0, kind='digital', dtype=None, timecode=IRIG_B, impairments=Impairments(),
+                 consecutive=True, chunk_frames=CHUNK_FRAMES):
+    """Write a corpus of count frames to the directory path, returns it opened with open_corpus"""
+    dtype = timecode.dtype(kind, dtype)
+    rng, times, offsets, length = _plan(count, seed, kind, timecode, impairments, consecutive)
+    os.makedirs(path, exist_ok=True)
+    signal = np.lib.format.open_memmap(os.path.join(path, 'signal.npy'), mode='w+', dtype=dtype, shape=(length,))
+    _render(signal, rng, times, offsets, kind, timecode, impairments, chunk_frames)
+    signal.flush()
+    del signal
+    np.save(os.path.join(path, 'times.npy'), times)
+    np.save(os.path.join(path, 'offsets.npy'), offsets)
+    with open(os.path.join(path, 'corpus.json'), 'w') as f:
+        json.dump({'count': count, 'seed': seed, 'kind': kind, 'dtype': dtype.str, 'format': timecode.name,
+                   'sample_freq': timecode.sample_freq, 'sample_rate': timecode.sample_rate(kind),
+                   'consecutive': consecutive, 'chunk_frames': chunk_frames,
+                   'impairments': impairments._asdict()}, f, indent=2)
+    return open_corpus(path)
+
+
+def open_corpus(path):
+    """Open a corpus written by write_corpus, its arrays are read-only memory maps
+    >>> import tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> corpus = write_corpus(path, 10, seed=3, impairments=Impairments(glitches=0.5), chunk_frames=4)
+    >>> np.array_equal(corpus.signal, make_corpus(10, seed=3, impairments=Impairments(glitches=0.5),
+    ...                                           chunk_frames=4).signal)
+    True
+    >>> open_corpus(path).times[0]
+    np.datetime64('2017-12-11T01:44:49')
+    """
+    with open(os.path.join(path, 'corpus.json')) as f:
+        sample_rate = json.load(f)['sample_rate']
+    arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in ('signal', 'times', 'offsets')]
+    return Corpus(*arrays, sample_rate=sample_rate)
+
+
+def score(corpus, offsets, times, flags, tolerance=None):
+    """Compare the frames a decoder found in a corpus (sample offsets, times
+    and flags, as from decode.decode_signal) with the frames of the corpus.
+    Offsets must be within tolerance samples, half a bit of a 100 bit frame by default."""
+    truth = np.asarray(corpus.offsets)
+    if tolerance is None:
+        tolerance = (truth[-1] - truth[0]) / (len(truth) - 1) / 200 if len(truth) > 1 else 0
+    offsets = np.asarray(offsets, dtype=np.int64)
+    right = np.clip(np.searchsorted(truth, offsets), 0, len(truth) - 1)
+    left = np.maximum(right - 1, 0)
+    nearest = np.where(np.abs(offsets - truth[left]) < np.abs(offsets - truth[right]), left, right)
+    good = np.asarray(flags) == 0
+    correct = good & (np.abs(offsets - truth[nearest]) <= tolerance) & (times == corpus.times[nearest])
+    decoded = len(np.unique(nearest[correct]))
+    return Score(decoded, int(np.count_nonzero(good & ~correct)), len(truth) - decoded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m irig.corpus', description=__doc__.split('\n')[0])
+    parser.add_argument('path', help='directory to write the corpus to')
+    parser.add_argument('--frames', type=int, default=1000, help='number of frames')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--kind', choices=('digital', 'analog'), default='digital')
+    parser.add_argument('--dtype', default=None, help='sample type, int16 (digital) or float32 (analog) by default')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='B', help='IRIG timecode format')
+    parser.add_argument('--random-times', action='store_true', help='draw every frame time at random')
+    for name in Impairments._fields:
+        parser.add_argument('--' + name.replace('_', '-'), type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    impairments = Impairments(*[getattr(args, name) for name in Impairments._fields])
+    corpus = write_corpus(args.path, args.frames, args.seed, args.kind, args.dtype, FORMATS[args.format],
+                          impairments, not args.random_times)
+    print('%s: %d frames, %d samples at %d Hz' % (args.path, len(corpus.times), len(corpus.signal),
+                                                   corpus.sample_rate), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
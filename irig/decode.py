@@ -0,0 +1,818 @@
+"""Vectorized decoding of IRIG signals.
+
+The decoders here measure pulses with NumPy over whole chunks of samples, so
+the Python level work scales with the number of IRIG symbols (100 per frame)
+rather than with the number of samples.
+"""
+import math
+import time
+from datetime import timedelta
+from fractions import Fraction
+
+import numpy as np
+
+from irig.formats import IRIG_B
+from irig.frame import IrigFrame
+from irig.utilities import BCD_FIELDS, BINARY_FIELDS, BIT_WIDTH, NUM_FRAME_BITS, PULSE_WIDTH, SYMBOLS, irigtime
+
+MARKER = SYMBOLS.index('_')
+
+# Quality flags of a decoded frame
+MARKER_ERROR = 1  # A marker is missing or misplaced, or a symbol code is invalid
+BCD_ERROR = 2     # A BCD digit is greater than 9
+RANGE_ERROR = 4   # A field is out of range, eg hour 24 or day of year 366 in a common year
+SBS_ERROR = 8     # The SBS field is set and does not match the BCD time of day. The time is kept.
+LOW_CONFIDENCE = 16  # A BCD digit is more likely wrong than right, see decode_digital. The time is kept.
+
+MARKER_POSITIONS = np.array([0] + list(range(9, NUM_FRAME_BITS, 10)))
+_IS_MARKER = np.isin(np.arange(NUM_FRAME_BITS), MARKER_POSITIONS)
+
+# Weights of the frame bits in each BCD digit, digits in BCD_FIELDS order
+_DIGITS = [digit for digits in BCD_FIELDS.values() for digit in digits]
+_DIGIT_WEIGHTS = np.zeros((NUM_FRAME_BITS, len(_DIGITS)), dtype=np.float32)
+for _column, (_index, _width) in enumerate(_DIGITS):
+    _DIGIT_WEIGHTS[_index:_index + _width, _column] = 1 << np.arange(_width)[::-1]
+
+# Positions and weights of the SBS bits
+_SBS_POSITIONS = np.concatenate([np.arange(index, index + width) for index, width in BINARY_FIELDS['sbs']])
+_SBS_WEIGHTS = 1 << np.arange(len(_SBS_POSITIONS), dtype=np.int64)
+_SBS_MASK = sum(1 << int(position) for position in _SBS_POSITIONS)  # Of IrigFrame.value
+
+# Maps symbol codes back to the characters of a bit string, and back again
+_BIT_CHARS = bytes.maketrans(bytes(range(len(SYMBOLS))), SYMBOLS.encode('ascii'))
+_SYMBOL_CODES = bytes.maketrans(SYMBOLS.encode('ascii'), bytes(range(len(SYMBOLS))))
+
+
+def bits_from_symbols(codes):
+    """Convert a sequence of symbol codes into a bit string
+    >>> bits_from_symbols([2, 0, 1, 2])
+    '_01_'
+    """
+    return np.asarray(codes, dtype=np.uint8).tobytes().translate(_BIT_CHARS).decode('ascii')
+
+
+def classify_pulses(widths, min_widths=IRIG_B.min_widths):
+    """Returns the symbol code of each pulse width, -1 for pulses too short to be a symbol
+    >>> classify_pulses([1, 2, 5, 8, 10])
+    array([-1,  0,  1,  2,  2])
+    >>> classify_pulses([1, 3, 4, 6, 7], IRIG_B.nearest_widths)
+    array([0, 0, 1, 1, 2])
+    """
+    return np.searchsorted(min_widths, widths, side='right') - 1
+
+
+def _window(recent, signal, first, start, stop):
+    """Samples start to stop of a stream, from signal, whose first sample is
+    sample first of the stream, and recent, the samples just before it. None
+    if they are not all there."""
+    if start < first - len(recent) or stop > first + len(signal):
+        return None
+    if start >= first:
+        return signal[start - first:stop - first]
+    before = recent[len(recent) - (first - start):len(recent) - max(first - stop, 0)]
+    return np.concatenate((before, signal[:max(stop - first, 0)]))
+
+
+def _keep(recent, signal, count):
+    """A copy of the last count samples of recent followed by signal"""
+    return np.concatenate((recent[max(len(recent) + len(signal) - count, 0):], signal[max(len(signal) - count, 0):]))
+
+
+def _pulses(high, level=False, run=0):
+    """Find the pulses in a boolean level array.
+
+    level and run are the level of the sample before the array and, if high,
+    how long it has been high. Returns the start positions and widths of the
+    pulses that end in the array, and how long the array has been high at its end.
+    """
+    changes = np.flatnonzero(np.diff(high.view(np.int8), prepend=np.int8(level)))
+    rises = changes[high[changes]]
+    falls = changes[~high[changes]]
+
+    starts = np.concatenate(([-run], rises)) if level else rises
+    widths = falls - starts[:len(falls)]
+
+    if len(high) and high[-1]:
+        run = len(high) - starts[-1]
+    elif len(high):
+        run = 0
+    return starts[:len(falls)], widths, run
+
+
+def cycle_bounds(first, length, samples_per_cycle):
+    """Returns the sample indices, relative to the start of cycle first, of the
+    boundaries of the complete carrier cycles in length samples. Cycle k of a
+    signal starts at sample ceil(k * samples_per_cycle).
+    >>> cycle_bounds(1, 10, Fraction(5, 2))
+    array([ 0,  2,  5,  7, 10])
+    """
+    num, den = samples_per_cycle.numerator, samples_per_cycle.denominator
+    start = -(-first * num // den)
+    last = (start + length) * den // num
+    return -(-np.arange(first, last + 1) * num // den) - start
+
+
+def cycle_energy(signal, bounds):
+    """Returns the mean square of each carrier cycle of signal between bounds"""
+    signal = np.asarray(signal, dtype=np.float64)
+    if len(bounds) < 2:
+        return np.empty(0)
+    return np.add.reduceat(signal * signal, bounds[:-1]) / np.diff(bounds)
+
+
+def demodulate_analog(signal, timecode=IRIG_B):
+    """Demodulate an analog signal aligned to carrier cycles into a bit string.
+
+    Cycles are high when their envelope (mean square) is above the midpoint of
+    the large and small amplitude levels found in signal.
+    """
+    energy = cycle_energy(signal, cycle_bounds(0, len(signal), timecode.samples_per_cycle))
+    low, high = np.percentile(energy, [5, 95])
+    _, widths, _ = _pulses(energy > (low + high) / 2)
+    codes = classify_pulses(widths, timecode.nearest_widths)
+    return bits_from_symbols(codes[codes >= 0])
+
+
+def sbs_many(symbols):
+    """Read the straight binary seconds of each row of an N x 100 array of
+    symbol codes, without decoding the BCD fields
+    >>> from irig.render import symbols
+    >>> sbs_many([symbols(irigtime(2016, 8, 26, 2, 11, 11).bits)])
+    array([7871])
+    """
+    symbols = np.asarray(symbols, dtype=np.uint8)
+    return (symbols[:, _SBS_POSITIONS] == 1).astype(np.int64) @ _SBS_WEIGHTS
+
+
+def from_bits_many(symbols):
+    """Decode the BCD time of each row of an N x 100 array of symbol codes.
+
+    Returns the times as a datetime64[s] array and the quality flags of each
+    row. Rows that can not be decoded are NaT and flagged instead of raising.
+    A mismatched SBS field is flagged, but the BCD time is kept.
+
+    >>> from irig.render import symbols
+    >>> frames = [symbols(irigtime(2016, 8, 26, 2, 11, 11).bits), symbols('_' * 100)]
+    >>> times, flags = from_bits_many(frames)
+    >>> times
+    array(['2016-08-26T02:11:11',                 'NaT'],
+          dtype='datetime64[s]')
+    >>> flags
+    array([0, 5], dtype=uint8)
+    """
+    symbols = np.asarray(symbols, dtype=np.uint8)
+    if symbols.ndim != 2 or symbols.shape[1] != NUM_FRAME_BITS:
+        raise ValueError('symbols must be an N x %d array' % NUM_FRAME_BITS)
+
+    flags = np.zeros(len(symbols), dtype=np.uint8)
+    flags[((symbols == MARKER) != _IS_MARKER).any(axis=1) | (symbols > MARKER).any(axis=1)] |= MARKER_ERROR
+
+    digits = ((symbols == 1).astype(np.float32) @ _DIGIT_WEIGHTS).astype(np.int64)
+    flags[(digits > 9).any(axis=1)] |= BCD_ERROR
+
+    values, column = [], 0
+    for field in BCD_FIELDS.values():
+        value = np.zeros(len(symbols), dtype=np.int64)
+        for i in reversed(range(len(field))):
+            value = value * 10 + digits[:, column + i]
+        values.append(value)
+        column += len(field)
+    second, minute, hour, day_of_year, year = values
+
+    days_in_year = np.where(year % 4 == 0, 366, 365)
+    out_of_range = ((second > 59) | (minute > 59) | (hour > 23) |
+                    (day_of_year < 1) | (day_of_year > days_in_year))
+    flags[out_of_range] |= RANGE_ERROR
+
+    times = (year + 2000 - 1970).astype('datetime64[Y]').astype('datetime64[s]')
+    times += ((day_of_year - 1) * 86400 + hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+    times[flags != 0] = np.datetime64('NaT')
+
+    # Many generators leave SBS unset, so only a set field is checked
+    sbs = sbs_many(symbols)
+    flags[(sbs != 0) & (sbs != hour * 3600 + minute * 60 + second)] |= SBS_ERROR
+    return times, flags
+
+
+# Duty cycle thresholds of the edge decoder, as fractions of the bit period.
+# Nominal duty cycles are 0.2, 0.5 and 0.8, shorter pulses and gaps are glitches.
+DUTY_THRESHOLDS = np.array([0.35, 0.65])
+GLITCH_DUTY = 0.1
+
+
+def edges(signal, threshold=0):
+    """Returns the sample indices of the rising and falling edges of a digital
+    signal, samples above threshold are high.
+    >>> edges([0, 5, 5, 0, 0, 5, 0])
+    (array([1, 5]), array([3, 6]))
+    """
+    high = np.asarray(signal) > threshold
+    changes = np.flatnonzero(np.diff(high.view(np.int8), prepend=np.int8(0)))
+    rising = high[changes]
+    return changes[rising], changes[~rising]
+
+
+def decode_edges(rising, falling, timecode=IRIG_B):
+    """Decode the frames of a digital signal given as edge timestamps.
+
+    rising and falling are sorted times of the rising and falling edges, in
+    any unit: sample indices of a capture at any rate, or seconds from a logic
+    analyzer. Pulses are classified by their duty cycle in the bit period,
+    measured as the median time between rising edges. High glitches shorter
+    than GLITCH_DUTY of a bit are dropped and low glitches are bridged.
+
+    Returns the time of the rising edge that starts each frame (its on-time
+    edge), the decoded times and the quality flags, as from_bits_many.
+
+    >>> from irig.render import encode_range
+    >>> signal = np.repeat(encode_range(irigtime(2016, 7, 20, 1, 49), 3, flat=True), 37)
+    >>> starts, times, flags = decode_edges(*edges(signal[5000:]))
+    >>> starts, times
+    (array([32000, 69000]), array(['2016-07-20T01:49:01', '2016-07-20T01:49:02'],
+          dtype='datetime64[s]'))
+    >>> decode_edges(*np.divide(edges(signal[5000:]), 37e3))[0]
+    array([0.86486486, 1.86486486])
+    """
+    rising, falling = np.asarray(rising), np.asarray(falling)
+    if len(rising):
+        falling = falling[falling > rising[0]]
+    count = min(len(rising), len(falling))
+    rising, falling = rising[:count], falling[:count]
+    if (falling <= rising).any() or (rising[1:] <= falling[:-1]).any():
+        raise ValueError('rising and falling edges must alternate')
+    empty = (rising[:0], np.empty(0, dtype='datetime64[s]'), np.empty(0, dtype=np.uint8))
+    if count < 2:
+        return empty
+
+    period = np.median(np.diff(rising))
+    keep = falling - rising >= GLITCH_DUTY * period
+    rising, falling = rising[keep], falling[keep]
+    bridged = rising[1:] - falling[:-1] < GLITCH_DUTY * period
+    rising = rising[np.concatenate(([True], ~bridged))]
+    falling = falling[np.concatenate((~bridged, [True]))]
+
+    codes = np.searchsorted(DUTY_THRESHOLDS * period, falling - rising, side='right')
+    firsts, times, flags = _decode_codes(codes, timecode)
+    return rising[firsts], times, flags
+
+
+def _decode_codes(codes, timecode):
+    """Decode the frames in a stream of symbol codes, which start after a
+    double marker. Returns the index of the first symbol of each frame, and the
+    times and flags of from_bits_many."""
+    firsts = np.flatnonzero((codes[1:] == MARKER) & (codes[:-1] == MARKER)) + 1
+    firsts = firsts[firsts + timecode.num_bits <= len(codes)]
+    if not len(firsts):
+        return firsts, np.empty(0, dtype='datetime64[s]'), np.empty(0, dtype=np.uint8)
+
+    # Frames shorter than 100 bits are padded with the symbols of an empty frame
+    frames = np.tile(np.where(_IS_MARKER, MARKER, 0).astype(np.uint8), (len(firsts), 1))
+    frames[:, :timecode.num_bits] = codes[firsts[:, None] + np.arange(timecode.num_bits)]
+    times, flags = from_bits_many(frames)
+    return firsts, times, flags
+
+
+# Thresholds of the Schmitt trigger of demodulate_digital, as fractions of the
+# way from the low to the high level of the signal
+HYSTERESIS = (0.4, 0.6)
+CONFIDENCE_THRESHOLD = 0.5  # Probability of a BCD digit being right below which decode_digital flags LOW_CONFIDENCE
+INVALID = len(SYMBOLS)  # Symbol code of a bit period that is too short or too long
+_DUTIES = np.array([BIT_WIDTH[symbol] / PULSE_WIDTH for symbol in SYMBOLS])
+
+
+def _runs(above, below):
+    """Run starts and levels of the output of a Schmitt trigger that goes high
+    where above and low where below, starting low"""
+    decided = np.flatnonzero(above | below)
+    level = above[decided]
+    changed = np.diff(level.view(np.int8), prepend=np.int8(0)) != 0
+    starts, levels = decided[changed], level[changed]
+    if not len(starts) or starts[0]:
+        starts, levels = np.concatenate(([0], starts)), np.concatenate(([False], levels))
+    return starts, levels
+
+
+def _drop_short(starts, levels, length, level, min_width):
+    """Give the runs at level shorter than min_width the level around them, and merge the runs"""
+    widths = np.diff(starts, append=length)
+    levels = levels ^ ((levels == level) & (widths < min_width))
+    keep = np.diff(levels.view(np.int8), prepend=np.int8(not levels[0])) != 0 if len(levels) else levels
+    return starts[keep], levels[keep]
+
+
+def _on_grid(rising, samples_per_bit):
+    """Keep the rising edges a whole number of bits (within a quarter of a bit)
+    after the last edge kept, or two bits or more after it"""
+    kept, last = [], None
+    for edge in rising.tolist():
+        if last is not None and edge - last < 2 * samples_per_bit:
+            bits = round((edge - last) / samples_per_bit)
+            if not bits or abs(edge - last - bits * samples_per_bit) > samples_per_bit / 4:
+                continue
+        kept.append(edge)
+        last = edge
+    return np.array(kept, dtype=np.intp)
+
+
+def _distances(sums, squares, starts, ends):
+    """Squared distance of the normalized samples of each bit, from starts to
+    ends, to each symbol template (stretched to its length), as |s|^2 - 2 s.t
+    + |t|^2 from cumulative sums of the samples and their squares. Returns
+    the distances and the widths of the templates."""
+    widths = np.rint(_DUTIES * (ends - starts)[:, None]).astype(np.intp)
+    distances = ((squares[ends] - squares[starts])[:, None] - 2 * (sums[starts[:, None] + widths] - sums[starts[:, None]])
+                 + widths)
+    return distances, widths
+
+
+def _demodulate(signal, timecode, samples_per_bit, levels, min_width):
+    """demodulate_digital, which also returns the cumulative sums of the
+    normalized samples and of their squares, None if there are no bits"""
+    signal = np.asarray(signal)
+    samples_per_bit = samples_per_bit or timecode.pulse_width
+    if min_width is None:
+        min_width = int(_DUTIES[0] * samples_per_bit) // 2
+    empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.uint8), np.empty(0), None, None)
+    if levels is None:
+        levels = np.percentile(signal, [5, 95]) if len(signal) else (0, 0)
+    low, high = levels
+    if high <= low:
+        return empty
+
+    lower, upper = low + np.multiply(HYSTERESIS, high - low)
+    starts, levels = _runs(signal > upper, signal < lower)
+    starts, levels = _drop_short(starts, levels, len(signal), True, min_width)
+    starts, levels = _drop_short(starts, levels, len(signal), False, min_width)
+    rising = _on_grid(starts[levels], samples_per_bit)
+
+    # Bits end at the next rising edge, or a nominal bit after the last one
+    last = rising[-1:] + int(round(samples_per_bit))
+    ends = np.concatenate((rising[1:], last[last <= len(signal)]))
+    rising = rising[:len(ends)]
+    if not len(rising):
+        return empty
+
+    normal = np.clip((signal - low) / (high - low), 0, 1)
+    sums = np.concatenate(([0], np.cumsum(normal)))
+    squares = np.concatenate(([0], np.cumsum(normal * normal)))
+    distances, widths = _distances(sums, squares, rising, ends)
+    order = np.argsort(distances, axis=1)
+    nearest, second = order[:, 0], order[:, 1]
+    rows = np.arange(len(rising))
+    gap = np.abs(widths[rows, nearest] - widths[rows, second])
+    confidence = np.clip((distances[rows, second] - distances[rows, nearest]) / np.maximum(gap, 1), 0, 1)
+
+    codes = nearest.astype(np.uint8)
+    lengths = ends - rising
+    invalid = (lengths < 0.75 * samples_per_bit) | (lengths > 1.25 * samples_per_bit)
+    codes[invalid] = INVALID
+    confidence[invalid] = 0
+    return rising, codes, confidence, sums, squares
+
+
+def _grid_probabilities(sums, squares, rising, codes):
+    """Probability that each bit of each frame is right, given the rising
+    edges and symbol codes of the N x num_bits bits of N frames.
+
+    The bits are classified again on a grid of equal bits fitted to the edges
+    of their frame, so that the timing error of an edge does not move the bit.
+    A bit the grid gives another code is wrong. Otherwise its probability comes
+    from the log likelihood ratio of the two nearest templates under Gaussian
+    noise, (d2 - d1) / 2 sigma^2, with sigma^2 the mean squared distance of the
+    samples to the nearest template over all the frames.
+    """
+    count = rising.shape[1]
+    bits = np.arange(count)
+    slopes = ((bits - bits.mean()) * (rising - rising.mean(axis=1, keepdims=True))).sum(axis=1) / \
+        ((bits - bits.mean()) ** 2).sum()
+    offsets = np.median(rising - slopes[:, None] * bits, axis=1)
+    bounds = np.rint(offsets[:, None] + slopes[:, None] * np.arange(count + 1)).astype(np.intp)
+    bounds = np.clip(bounds, 0, len(sums) - 1)
+    starts, ends = bounds[:, :-1].ravel(), bounds[:, 1:].ravel()
+
+    distances, _ = _distances(sums, squares, starts, ends)
+    nearest = np.argmin(distances, axis=1)
+    distances.sort(axis=1)
+    variance = max(distances[:, 0].sum() / max((ends - starts).sum(), 1), 1e-6)
+    probabilities = 0.5 * (1 + np.tanh((distances[:, 1] - distances[:, 0]) / (4 * variance)))
+    probabilities[nearest != codes.ravel()] = 0
+    return probabilities.reshape(rising.shape)
+
+
+def demodulate_digital(signal, timecode=IRIG_B, samples_per_bit=None, levels=None, min_width=None):
+    """Demodulate a real valued digital signal into symbols, with a confidence per bit.
+
+    Samples are normalized between the low and high levels of the signal (its
+    5th and 95th percentiles unless levels is given). A Schmitt trigger with
+    HYSTERESIS thresholds finds the pulses, and then pulses and gaps shorter
+    than min_width samples (half a '0' pulse by default) are glitches and are
+    removed. Rising edges off the bit grid, like those of glitches too long
+    for min_width, are dropped. Each bit runs from a rising edge to the next,
+    and is classified as the nearest of the symbol templates (stretched to its
+    length) to its normalized samples. A bit far from the nominal length, eg
+    across a dropout, is INVALID.
+
+    The confidence of a bit is how much closer it is to its template than to
+    the next nearest one, 1 for a clean bit and 0 halfway between two symbols.
+    samples_per_bit is the nominal length of a bit, that of a signal with
+    one sample per carrier cycle by default.
+
+    Returns the sample index each bit starts at, its symbol code and its confidence.
+
+    >>> from irig.render import encode_range
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 1, flat=True) + np.random.default_rng(1).normal(0, 1, 1000)
+    >>> starts, codes, confidence = demodulate_digital(signal)
+    >>> bits_from_symbols(codes) == irigtime(2016, 7, 20, 1, 49).bits
+    True
+    >>> starts[:4], confidence[:4].round(2)
+    (array([ 0, 10, 20, 30]), array([0.79, 0.72, 0.53, 0.39]))
+    """
+    return _demodulate(signal, timecode, samples_per_bit, levels, min_width)[:3]
+
+
+def decode_digital(signal, timecode=IRIG_B, samples_per_bit=None, levels=None, min_width=None):
+    """Decode the frames of a real valued digital signal with demodulate_digital.
+
+    Returns the sample index of the start of each frame, the decoded times, the
+    quality flags and the confidence of each BCD field of each frame, a N x 5
+    array in BCD_FIELDS order. The confidence of a field is the probability
+    that its weakest digit is right, calibrated on the noise of the signal,
+    see _grid_probabilities. Frames with a digit below CONFIDENCE_THRESHOLD
+    are flagged LOW_CONFIDENCE, and keep their time.
+
+    >>> from irig.render import encode_range
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 3, flat=True).astype(np.float32)
+    >>> signal[[1203, 1215, 1480]] = [5, 5, 0]  # glitches
+    >>> signal += np.random.default_rng(1).normal(0, 0.75, len(signal))
+    >>> starts, times, flags, confidence = decode_digital(signal)
+    >>> starts, times, flags, confidence.round(2)
+    (array([1000, 2000]), array(['2016-07-20T01:49:01', '2016-07-20T01:49:02'],
+          dtype='datetime64[s]'), array([0, 0], dtype=uint8), array([[1., 1., 1., 1., 1.],
+           [1., 1., 1., 1., 1.]]))
+    >>> np.isnat(decode_signal(signal)[1]).all()  # a single threshold decodes none
+    np.True_
+
+    Frames that decode to a wrong but valid time are flagged:
+
+    >>> from irig.corpus import Impairments, make_corpus, score
+    >>> corpus = make_corpus(300, 1, impairments=Impairments(noise=0.2))
+    >>> starts, times, flags, confidence = decode_digital(corpus.signal)
+    >>> score(corpus, starts, times, flags)
+    Score(decoded=175, wrong=0, missed=125)
+    >>> starts[flags == LOW_CONFIDENCE]
+    array([145000, 210000, 256000, 272000])
+    >>> frame = starts == 145000  # day 115 instead of 117
+    >>> times[frame], confidence[frame].round(2)
+    (array(['2047-04-25T05:12:48'], dtype='datetime64[s]'), array([[1., 1., 1., 0., 1.]]))
+    """
+    starts, codes, _, sums, squares = _demodulate(signal, timecode, samples_per_bit, levels, min_width)
+    firsts, times, flags = _decode_codes(codes, timecode)
+    if not len(firsts):
+        return starts[:0], times, flags, np.empty((0, len(BCD_FIELDS)))
+
+    bits = firsts[:, None] + np.arange(timecode.num_bits)
+    probabilities = np.ones((len(firsts), NUM_FRAME_BITS))
+    probabilities[:, :timecode.num_bits] = _grid_probabilities(sums, squares, starts[bits], codes[bits])
+
+    confidence = np.empty((len(firsts), len(BCD_FIELDS)))
+    for field, digits in enumerate(BCD_FIELDS.values()):
+        confidence[:, field] = np.min([probabilities[:, index:index + width].prod(axis=1)
+                                       for index, width in digits], axis=0)
+    flags[(confidence < CONFIDENCE_THRESHOLD).any(axis=1)] |= LOW_CONFIDENCE
+    return starts[firsts], times, flags, confidence
+
+
+def decode_signal(signal, kind='digital', timecode=IRIG_B):
+    """Decode the frames of a whole signal array with decode_edges.
+
+    An analog signal must start at a carrier cycle, its cycles are high when
+    their envelope is above the midpoint of the levels found in signal.
+    Returns the sample index of the start of each frame, the decoded times and
+    the quality flags.
+    """
+    if kind == 'digital':
+        return decode_edges(*edges(signal), timecode=timecode)
+    bounds = cycle_bounds(0, len(signal), timecode.samples_per_cycle)
+    energy = cycle_energy(signal, bounds)
+    if not len(energy):
+        return decode_edges([], [], timecode)
+    low, high = np.percentile(energy, [5, 95])
+    starts, times, flags = decode_edges(*edges(energy, (low + high) / 2), timecode=timecode)
+    return bounds[starts], times, flags
+
+
+class DigitalDecoder(object):
+    """Decodes irigtimes from a digital (TTL) signal fed in arbitrary chunks.
+
+    The decoder synchronizes on the double marker (P9 followed by P0) that
+    starts every frame, and keeps partial pulses and partial frames between
+    chunks. Any nonzero sample is high, as in irigtime.demodulate_digital_signal.
+
+    Once a frame is decoded, the decoder tracks the stream: it predicts the
+    symbols of the next frame from the time of the last one, with the control
+    functions of the last one and with SBS if it had it, and only compares the
+    symbols received with the prediction. A mismatch falls back to
+    checking the markers of each symbol and decoding the frame in full, which
+    also resynchronizes the prediction.
+
+    >>> from irig.render import encode_range
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 3, flat=True)
+    >>> decoder = DigitalDecoder()
+    >>> frames = []
+    >>> for chunk in np.array_split(signal[313:], 7):
+    ...     frames.extend(decoder.feed(chunk))
+    >>> frames
+    [irigtime(2016, 7, 20, 1, 49, 1), irigtime(2016, 7, 20, 1, 49, 2)]
+    >>> decoder.tracked, decoder.mispredictions
+    (1, 0)
+
+    After each feed, edges holds the on-time edge of each frame returned, the
+    rising edge of its P0 marker in samples from the first sample fed, refined
+    to a fraction of a sample with ontime.refine_edges. Here the signal is
+    half a sample late, and the edges move from 686.5 and 1686.5 to:
+
+    >>> late = np.interp(np.arange(len(signal)) - 0.5, np.arange(len(signal)), signal)
+    >>> decoder, edges = DigitalDecoder(), []
+    >>> for chunk in np.array_split(late[313:], 7):
+    ...     _ = decoder.feed(chunk)
+    ...     edges.extend(decoder.edges)
+    >>> edges
+    [687.0, 1687.0]
+
+    metrics is an optional metrics.DecoderMetrics that the decoder records into.
+    """
+    def __init__(self, timecode=IRIG_B, min_widths=None, tracking=True, metrics=None):
+        self.timecode = timecode
+        self.min_widths = timecode.min_widths if min_widths is None else min_widths
+        self.tracking = tracking      # Verify frames against a prediction instead of decoding them
+        self.metrics = metrics        # metrics.DecoderMetrics, or None
+        self.position = 0             # Number of samples fed so far
+        self.sync_losses = 0          # Number of times a misplaced marker broke sync
+        self.rejected = 0             # Number of synchronized frames that failed to decode
+        self.tracked = 0              # Number of frames that matched their prediction
+        self.mispredictions = 0       # Number of frames that did not
+        self._edges = []              # Functions that locate the on-time edges of the frames returned by the last feed
+        self._edge = None             # Function that locates the on-time edge of the frame being received
+        self._recent = np.empty(0)    # Last samples fed, to refine edges in
+        self._level = False           # Level of the last sample fed
+        self._run = 0                 # Length of the pulse still high at the end of the last chunk
+        self._previous = None         # Symbol code of the previous pulse
+        self._frame = None            # Symbol codes of the frame being received, None when unsynchronized
+        self._predicted = None        # Symbol codes of the predicted frame, None when not tracking
+        self._predicted_time = None   # Start time of the predicted frame
+        self._control = 0             # Control functions of the last frame decoded in full
+        self._sbs = True              # Whether it had the SBS field set
+
+    @property
+    def edges(self):
+        """On-time edges of the frames returned by the last feed"""
+        return [edge() for edge in self._edges]
+
+    def feed(self, chunk):
+        """Feed the next chunk of samples, returns a list of the irigtimes of
+        frames completed by it"""
+        chunk = np.asarray(chunk)
+        first, recent = self.position, self._recent
+
+        def refine(edge):
+            # The samples refine_edges looks at, 3 either side of the edge, copied as the chunk may be reused
+            window = _window(recent, chunk, first, edge - 3, edge + 3)
+            if window is None:
+                return lambda: math.nan
+            window = np.array(window, dtype=np.float64)
+
+            def locate():
+                from irig.ontime import refine_edges
+                return edge - 3 + float(refine_edges(window, [3], (window.min(), window.max()))[0])
+            return locate
+
+        frames = self._feed(chunk != 0, len(chunk), refine)
+        self._recent = _keep(recent, chunk, 2 * self.timecode.pulse_width)
+        return frames
+
+    def _feed(self, high, samples, refine):
+        """Feed levels, samples is the number of samples they are from. refine
+        returns a function that locates the on-time edge of a frame, given the
+        index of the level its P0 marker starts at, so that edges are only
+        located when they are read."""
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+            before = (self.sync_losses, self.rejected, self.tracked, self.mispredictions)
+        starts, widths, self._run = _pulses(high, self._level, self._run)
+        starts += self.position
+        if len(high):
+            self._level = bool(high[-1])
+            self.position += len(high)
+        codes = classify_pulses(widths, self.min_widths)
+        if metrics is not None:
+            metrics.pulses(widths, codes)
+            metrics.stage('demodulate', start)
+        starts = starts[codes >= 0].tolist()
+        codes = codes[codes >= 0].astype(np.uint8).tobytes()
+        self._edges = []
+
+        frames = []
+        i = 0
+        while i < len(codes):
+            if self._frame is not None and self._predicted is not None:
+                index = len(self._frame)
+                piece = codes[i:i + self.timecode.num_bits - index]
+                if self._predicted.startswith(piece, index):
+                    self._frame += piece
+                    self._previous = piece[-1]
+                    i += len(piece)
+                    if len(self._frame) == self.timecode.num_bits:
+                        frames.append(self._track())
+                        self._edges.append(self._edge)
+                    continue
+                self._predicted = None
+                self.mispredictions += 1
+            frame = self._receive(codes[i])
+            if self._frame is not None and len(self._frame) == 1:
+                self._edge = refine(starts[i])
+            i += 1
+            if frame is not None:
+                frames.append(frame)
+                self._edges.append(self._edge)
+
+        if metrics is not None:
+            metrics.count(samples=samples, frames=len(frames), sync_losses=self.sync_losses - before[0],
+                          rejected=self.rejected - before[1], tracked=self.tracked - before[2],
+                          mispredictions=self.mispredictions - before[3])
+        return frames
+
+    def _receive(self, code):
+        """Add a symbol to the frame being received, returns its irigtime when complete"""
+        if self._frame is not None:
+            index = len(self._frame)
+            if (code == MARKER) == (index % 10 == 9):
+                self._frame.append(code)
+                self._previous = code
+                if index == self.timecode.num_bits - 1:
+                    return self._complete()
+                return None
+            self._frame = None
+            self.sync_losses += 1
+
+        if code == MARKER and self._previous == MARKER:
+            self._frame = bytearray([code])
+        self._previous = code
+        return None
+
+    def _complete(self):
+        bits = bits_from_symbols(self._frame)
+        self._frame = None
+        try:
+            if self.metrics is None:
+                t = irigtime.from_bits(bits)
+            else:
+                start = time.perf_counter()
+                fields = irigtime.fields_from_bits(bits)
+                start = self.metrics.stage('bcd', start)
+                t = irigtime.from_fields(*fields)
+                self.metrics.stage('datetime', start)
+        except ValueError:
+            self.rejected += 1
+            return None
+        if self.tracking:
+            received = IrigFrame.from_bits(bits)
+            self._control, self._sbs = received.control, received.sbs != 0
+            # Frames shorter than a second carry its start time. Keep the
+            # predicted time within the second, until a frame starts a new one.
+            expected = self._predicted_time
+            if expected is None or expected.replace(microsecond=0) != t:
+                expected = t
+            self._predict(expected)
+        return t
+
+    def _track(self):
+        """Complete a frame that matched its prediction, and predict the next"""
+        t = self._predicted_time
+        self._frame = None
+        self.tracked += 1
+        self._predict(t)
+        return t.replace(microsecond=0)
+
+    def _predict(self, t):
+        """Predict the frame after the one that started at t"""
+        if self.metrics is not None:
+            start = time.perf_counter()
+        self._predicted_time = t + timedelta(seconds=float(self.timecode.frame_duration))
+        frame = IrigFrame.from_irigtime(self._predicted_time, self._control)
+        if not self._sbs:
+            frame.value &= ~_SBS_MASK
+        bits = frame.bits[:self.timecode.num_bits]
+        self._predicted = bits.encode('ascii').translate(_SYMBOL_CODES)
+        if self.metrics is not None:
+            self.metrics.stage('predict', start)
+
+
+class AnalogDecoder(object):
+    """Decodes irigtimes from an analog (AM) signal fed in arbitrary blocks.
+
+    The envelope of each carrier cycle is its mean square. A cycle is high
+    when its envelope is above the midpoint of the large and small amplitude
+    levels, which are tracked across blocks so the threshold adapts to slow
+    changes in gain. Samples of an incomplete cycle are kept for the next block.
+
+    >>> from irig.render import encode_range
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 3, kind='analog', flat=True)
+    >>> decoder = AnalogDecoder()
+    >>> frames = []
+    >>> for block in np.array_split(signal[10001:], 9):
+    ...     frames.extend(decoder.feed(block))
+    >>> frames
+    [irigtime(2016, 7, 20, 1, 49, 1), irigtime(2016, 7, 20, 1, 49, 2)]
+
+    After each feed, edges holds the on-time edge of each frame returned, in
+    samples from the first sample fed, located to a fraction of a sample with
+    ontime.carrier_edges. Here the signal is 10.3 samples late:
+
+    >>> late = np.interp(np.arange(len(signal)) - 10.3, np.arange(len(signal)), signal)
+    >>> decoder, edges = AnalogDecoder(), []
+    >>> for block in np.array_split(late[10001:], 9):
+    ...     _ = decoder.feed(block)
+    ...     edges.extend(decoder.edges)
+    >>> np.round(edges, 2)
+    array([22009.3, 54009.3])
+
+    metrics is an optional metrics.DecoderMetrics that the decoder records
+    into, its pulse widths are in carrier cycles.
+    """
+    def __init__(self, timecode=IRIG_B, smoothing=0.05, tracking=True, metrics=None):
+        self.timecode = timecode
+        self.smoothing = smoothing    # Weight of each new cycle in the level estimates
+        self.metrics = metrics        # metrics.DecoderMetrics, or None
+        self.digital = DigitalDecoder(timecode, timecode.nearest_widths, tracking, metrics)
+        self._cycles = 0              # Number of complete carrier cycles fed so far
+        self._partial = np.empty(0)   # Samples of the incomplete cycle
+        self._low = None              # Estimated envelope of small cycles
+        self._high = None             # Estimated envelope of large cycles
+        self._recent = np.empty(0)    # Last samples of complete cycles, to locate edges in
+
+    @property
+    def edges(self):
+        """On-time edges of the frames returned by the last feed"""
+        return self.digital.edges
+
+    def feed(self, block):
+        """Feed the next block of samples, returns a list of the irigtimes of
+        frames completed by it"""
+        if self.metrics is not None:
+            start = time.perf_counter()
+        signal = np.concatenate((self._partial, np.asarray(block, dtype=np.float64)))
+        samples_per_cycle = self.timecode.samples_per_cycle
+        bounds = cycle_bounds(self._cycles, len(signal), samples_per_cycle)
+        first = -(-self._cycles * samples_per_cycle.numerator // samples_per_cycle.denominator)
+        self._cycles += len(bounds) - 1
+        self._partial = signal[bounds[-1]:]
+        energy = cycle_energy(signal, bounds)
+        if not len(energy):
+            high = np.zeros(0, dtype=bool)
+        elif self._low is None and not energy.max() > 2 * energy.min():  # no modulation seen yet, or silence
+            high = np.zeros(len(energy), dtype=bool)
+        else:
+            if self._low is None:
+                self._low, self._high = energy.min(), energy.max()
+            high = energy > (self._low + self._high) / 2
+            self._low = self._track(self._low, energy[~high])
+            self._high = self._track(self._high, energy[high])
+        if self.metrics is not None:
+            self.metrics.stage('envelope', start)
+
+        recent = self._recent
+        # P0 is classified once a low cycle follows it, so the cycles of a marker after its edge are there
+        cycles = self.timecode.bit_width['_'] - 1
+        half = int(math.ceil(cycles * float(samples_per_cycle)))
+
+        def refine(cycle):
+            edge = -(-cycle * samples_per_cycle.numerator // samples_per_cycle.denominator)
+            window = _window(recent, signal, first, edge - half, edge + half)
+            if window is None:
+                return lambda: math.nan
+            window = window.copy()
+
+            def locate():
+                from irig.ontime import carrier_edges
+                return edge - half + float(carrier_edges(window, [half], self.timecode, cycles, edge - half)[0])
+            return locate
+
+        frames = self.digital._feed(high, len(block), refine)
+        # Edges are at most a bit before the cycles of the next block
+        bit = int(math.ceil(self.timecode.pulse_width * float(samples_per_cycle)))
+        self._recent = _keep(recent, signal[:bounds[-1]], half + bit)
+        return frames
+
+    def _track(self, level, energy):
+        """Move a level estimate towards the median of the cycles classified
+        to it. The median ignores the cycles that straddle a change in amplitude."""
+        if not len(energy):
+            return level
+        weight = 1 - (1 - self.smoothing) ** len(energy)
+        return level + weight * (np.median(energy) - level)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,175 @@
+"""Rendering of one timecode to many output channels.
+
+A FanoutRenderer renders each frame once, into a buffer shared by all the
+channels, and then shifts and scales it for each channel. Channels with the
+same delay share one interpolated copy, which is scaled by the gain of each
+channel straight into the output, channels that also share a gain share one
+scaled copy, and channels with a whole sample delay at unit gain are plain
+views of the buffer. Only integer samples are rounded, and clipped when
+their gain could take them out of range.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+from irig.formats import IRIG_B
+from irig.render import encode_range
+
+LAYOUTS = ('planar', 'interleaved')
+
+
+class FanoutRenderer(object):
+    """Renders consecutive frames from start to a number of channels.
+
+    Each channel compensates the latency of its output, eg its cable and DAC,
+    by playing the signal that many samples early: sample n of a channel is
+    sample n + delay of the signal, interpolated linearly between samples for
+    fractional delays. A negative delay plays it late. Samples before the
+    first frame are zero.
+
+    Parameters
+      start    : irigtime of the first frame, which starts at sample 0
+      delays   : latency of each channel, in samples, one per channel
+      gains    : gain of each channel, 1 by default
+      kind     : 'analog' or 'digital'
+      dtype    : sample type, integer samples are rounded and clipped after the gain
+      timecode : formats.TimecodeFormat
+      layout   : 'planar' blocks are (channels, samples), 'interleaved' (samples, channels)
+      control  : control functions payload of every frame
+
+    >>> from irig.utilities import irigtime
+    >>> fanout = FanoutRenderer(irigtime(2016, 7, 20, 1, 49), [0, 2, -3, 0.5], [1, 1, 1, 0.5], kind='digital')
+    >>> fanout.read(12)
+    array([[5, 5, 5, 5, 5, 5, 5, 5, 0, 0, 5, 5],
+           [5, 5, 5, 5, 5, 5, 0, 0, 5, 5, 0, 0],
+           [0, 0, 0, 5, 5, 5, 5, 5, 5, 5, 5, 0],
+           [2, 2, 2, 2, 2, 2, 2, 1, 0, 1, 2, 1]], dtype=int16)
+    >>> fanout.read(2, layout='interleaved')
+    array([[0, 0, 0, 0],
+           [0, 0, 5, 0]], dtype=int16)
+    >>> [view.base is not None for view in fanout.views(10)]
+    [True, True, True, False]
+    """
+    def __init__(self, start, delays, gains=None, kind='analog', dtype=None, timecode=IRIG_B,
+                 layout='planar', control=0):
+        if layout not in LAYOUTS:
+            raise ValueError('layout must be one of ' + ', '.join(LAYOUTS))
+        delays = np.asarray(delays, dtype=np.float64)
+        gains = np.ones(len(delays)) if gains is None else np.asarray(gains, dtype=np.float64)
+        if delays.ndim != 1 or gains.shape != delays.shape:
+            raise ValueError('delays and gains must have one value per channel')
+        self.start = start
+        self.delays = delays
+        self.gains = gains
+        self.kind = kind
+        self.dtype = timecode.dtype(kind, dtype)
+        self.timecode = timecode
+        self.layout = layout
+        self.control = control
+        self.position = 0             # Samples read from each channel so far
+        self._work = np.result_type(self.dtype, np.float32)  # Type that shifted and scaled samples are computed in
+
+        # Channels that share a delay, interpolated once, and within them those that share a gain, scaled once
+        shifts = np.floor(delays).astype(np.int64)
+        groups = {}
+        for channel, (shift, fraction, gain) in enumerate(zip(shifts.tolist(), (delays - shifts).tolist(),
+                                                              gains.tolist())):
+            groups.setdefault((shift, fraction), {}).setdefault(gain, []).append(channel)
+        self._groups = [(shift, fraction, [(gain, np.array(channels)) for gain, channels in scaled.items()])
+                        for (shift, fraction), scaled in groups.items()]
+        self._min_shift = int(shifts.min()) if len(shifts) else 0
+        self._max_shift = int(shifts.max()) + 1 if len(shifts) else 0
+
+        self._frames = 0              # Frames rendered so far
+        self._base = min(self._min_shift, 0)  # Signal sample index of the first buffered sample
+        self._buffer = np.zeros(-self._base, dtype=self.dtype)
+
+    @property
+    def channels(self):
+        return len(self.delays)
+
+    def _time(self, frame):
+        return self.start + timedelta(seconds=float(frame * self.timecode.frame_duration))
+
+    def _signal(self, first, stop):
+        """The signal samples from first to stop, rendering frames as needed and
+        dropping the samples before first from the buffer"""
+        end = self._base + len(self._buffer)
+        if stop > end:
+            frame_length = self.timecode.frame_length(self.kind)
+            count = -(-(stop - end) // frame_length)
+            frames = encode_range(self._time(self._frames), count * self.timecode.frame_duration, self.kind,
+                                  self.dtype, flat=True, timecode=self.timecode, control=self.control)
+            self._frames += count
+            self._buffer = np.concatenate((self._buffer[first - self._base:], frames))
+            self._base = first
+        elif first > self._base:
+            self._buffer = self._buffer[first - self._base:]
+            self._base = first
+        return self._buffer[first - self._base:stop - self._base]
+
+    def _scale(self, wave, gain, out):
+        """Scale wave by gain into out, rounding and clipping integer samples"""
+        if self.dtype.kind not in 'iu':
+            return np.multiply(wave, gain, out=out)
+        if gain != 1 or wave.dtype != self._work:
+            wave = np.multiply(wave, gain, dtype=self._work)
+        if not 0 <= gain <= 1:
+            info = np.iinfo(self.dtype)
+            wave = np.clip(wave, info.min, info.max, out=wave)
+        return np.rint(wave, out=out, casting='unsafe')
+
+    def _blocks(self, samples, rows=None):
+        """Yields the block of samples of each group of channels with the same
+        delay and gain, and the channels that it is still to be copied to, and
+        moves on by samples. A scaled block is written straight into the row of
+        its first channel when rows are given."""
+        first = self.position + self._min_shift
+        signal = self._signal(first, self.position + samples + self._max_shift)
+        steps = None
+        for shift, fraction, scaled in self._groups:
+            at = self.position + shift - first
+            block = wave = signal[at:at + samples]
+            if fraction:
+                if steps is None:
+                    steps = np.subtract(signal[1:], signal[:-1], dtype=self._work)
+                wave = np.multiply(steps[at:at + samples], fraction, dtype=self._work)
+                wave += block
+            for gain, channels in scaled:
+                if wave is block and gain == 1:
+                    yield channels, block
+                    continue
+                out = np.empty(samples, self.dtype) if rows is None else rows[channels[0]]
+                yield (channels if rows is None else channels[1:]), self._scale(wave, gain, out)
+        self.position += samples
+
+    def read(self, samples, out=None, layout=None):
+        """Returns the next samples of every channel, in out if it is given, as
+        a (channels, samples) or (samples, channels) array depending on layout"""
+        layout = layout or self.layout
+        if layout not in LAYOUTS:
+            raise ValueError('layout must be one of ' + ', '.join(LAYOUTS))
+        shape = (self.channels, samples) if layout == 'planar' else (samples, self.channels)
+        if out is None:
+            out = np.empty(shape, dtype=self.dtype)
+        elif out.shape != shape or out.dtype != self.dtype:
+            raise ValueError('out must be a %d x %d %s array' % (shape + (self.dtype,)))
+
+        rows = out if layout == 'planar' else out.T
+        for channels, block in self._blocks(samples, rows):
+            if len(channels):
+                rows[channels] = block
+        return out
+
+    def views(self, samples):
+        """Returns the next samples of every channel as a list of arrays.
+        Channels with a whole sample delay and unit gain are read-only views of
+        the shared buffer, and channels that share a delay and gain share an array."""
+        views = [None] * self.channels
+        for channels, block in self._blocks(samples):
+            if block.base is not None:
+                block = block.view()
+                block.flags.writeable = False
+            for channel in channels.tolist():
+                views[channel] = block
+        return views
@@ -0,0 +1,209 @@
+"""IRIG timecode formats, and the sample templates used to render them.
+
+A digital (TTL) signal has one sample per carrier cycle, so for IRIG-B each
+bit is PULSE_WIDTH samples wide. An analog (AM) signal is sampled at
+sample_freq, which need not be a multiple of the carrier frequency: carrier
+phase comes from a phase accumulator over the samples of a frame.
+
+Templates are built the first time a format renders a kind of signal in a
+dtype, and are cached on the format.
+"""
+from fractions import Fraction
+
+import numpy as np
+
+from irig.utilities import (TTL_AMP, AM_LARGE_AMP, AM_SMALL_AMP, PULSE_WIDTH,
+                            BIT_WIDTH, OFFSET, SAMPLES, SYMBOLS)
+
+KINDS = {'digital': 'int16', 'analog': 'float32'}  # Default dtype of each kind of signal
+
+
+def _ceil_div(a, b):
+    return -(-a // b)
+
+
+def _scale(wave, dtype, amplitude):
+    """Convert float samples to dtype, integer types are scaled to full scale"""
+    if dtype.kind in 'iu':
+        wave = np.rint(wave * (np.iinfo(dtype).max / amplitude))
+    return wave.astype(dtype)
+
+
+class TimecodeFormat(object):
+    """An IRIG timecode format.
+
+    Parameters
+      name            : timecode letter
+      num_bits        : bits per frame, 100 or 60. 60 bit frames carry the first
+                        60 symbols of a 100 bit frame, like random_frame(60)
+      frame_duration  : seconds per frame
+      carrier_freq    : carrier frequency of the analog signal, in Hz
+      sample_freq     : sample rate of the analog signal, SAMPLES per carrier cycle by default
+
+    >>> IRIG_B.pulse_width, IRIG_B.bit_width
+    (10, {'0': 2, '1': 5, '_': 8})
+    >>> fmt = IRIG_A.with_sample_freq(44100)
+    >>> fmt.samples_per_cycle, fmt.samples_per_bit, fmt.frame_samples
+    (Fraction(441, 100), Fraction(441, 10), 4410)
+    """
+    def __init__(self, name, num_bits, frame_duration, carrier_freq, sample_freq=None):
+        self.name = name
+        self.num_bits = num_bits
+        self.frame_duration = Fraction(frame_duration)
+        self.carrier_freq = carrier_freq
+        self.sample_freq = sample_freq or carrier_freq * SAMPLES
+
+        pulse_width = carrier_freq * self.frame_duration / num_bits
+        if pulse_width.denominator != 1 or pulse_width % PULSE_WIDTH:
+            raise ValueError('bits must be a multiple of %d carrier cycles long' % PULSE_WIDTH)
+        self.pulse_width = int(pulse_width)  # Digital samples (carrier cycles) per bit
+        self.bit_width = {symbol: BIT_WIDTH[symbol] * self.pulse_width // PULSE_WIDTH for symbol in SYMBOLS}
+
+        frame_samples = self.sample_freq * self.frame_duration
+        if frame_samples.denominator != 1:
+            raise ValueError('frames must be a whole number of samples long')
+        self.frame_samples = int(frame_samples)  # Analog samples per frame
+        self.samples_per_cycle = Fraction(self.sample_freq, carrier_freq)
+        self.samples_per_bit = Fraction(self.frame_samples, num_bits)
+
+        # Minimum pulse width of each symbol code, shorter pulses are discarded
+        widths = [self.bit_width[symbol] for symbol in SYMBOLS]
+        self.min_widths = np.array(widths)
+        # Minimum widths halfway between the nominal widths, for pulses
+        # measured from an envelope that may be off by a cycle at either edge
+        self.nearest_widths = np.array([_ceil_div(a + b, 2) for a, b in zip([0] + widths, widths)])
+
+        self._cache = {}
+
+    def with_sample_freq(self, sample_freq):
+        """Returns this format with a different analog sample rate"""
+        return TimecodeFormat(self.name, self.num_bits, self.frame_duration, self.carrier_freq, sample_freq)
+
+    def __repr__(self):
+        return 'TimecodeFormat(%r, %d, %s, %d, %d)' % (
+            self.name, self.num_bits, self.frame_duration, self.carrier_freq, self.sample_freq)
+
+    def frame_length(self, kind):
+        """Samples per frame of a kind of signal"""
+        return self.pulse_width * self.num_bits if kind == 'digital' else self.frame_samples
+
+    def sample_rate(self, kind):
+        """Sample rate of a kind of signal, a digital signal has one sample per carrier cycle"""
+        return self.carrier_freq if kind == 'digital' else self.sample_freq
+
+    def dtype(self, kind, dtype=None):
+        if kind not in KINDS:
+            raise ValueError('kind must be one of ' + ', '.join(KINDS))
+        return np.dtype(dtype or KINDS[kind])
+
+    def _cached(self, key, build):
+        if key not in self._cache:
+            value = build()
+            value.flags.writeable = False
+            self._cache[key] = value
+        return self._cache[key]
+
+    @property
+    def bit_bounds(self):
+        """Sample index that each bit of an analog frame starts at, and the frame length"""
+        spb = self.samples_per_bit
+        return self._cached('bounds', lambda: np.array(
+            [_ceil_div(k * spb.numerator, spb.denominator) for k in range(self.num_bits + 1)]))
+
+    @property
+    def sample_bits(self):
+        """The bit of each sample of an analog frame"""
+        return self._cached('bits', lambda: np.repeat(np.arange(self.num_bits), np.diff(self.bit_bounds)))
+
+    def digital_templates(self, dtype='int16'):
+        """Returns a read-only (3, pulse_width) array, the digital samples of each symbol
+        >>> IRIG_B.digital_templates()[2]
+        array([5, 5, 5, 5, 5, 5, 5, 5, 0, 0], dtype=int16)
+        """
+        dtype = np.dtype(dtype)
+
+        def build():
+            templates = np.zeros((len(SYMBOLS), self.pulse_width), dtype=dtype)
+            for code, symbol in enumerate(SYMBOLS):
+                templates[code, :self.bit_width[symbol]] = TTL_AMP
+            return templates
+        return self._cached(('digital', dtype), build)
+
+    def _analog_wave(self, samples):
+        """The analog samples of each symbol at sample indices of a frame, as a (3, len(samples)) array"""
+        fc, fs, spb = self.carrier_freq, self.sample_freq, self.samples_per_bit
+        bits = samples * spb.denominator // spb.numerator
+        cycles = samples * fc // fs - bits * self.pulse_width  # carrier cycle within the bit
+        phase = (samples * fc % fs) / fs                       # phase accumulator, in cycles
+        carrier = np.sin(phase * 2 * np.pi)
+        high = self.digital_templates('int8')[:, cycles] != 0
+        return np.where(high, AM_LARGE_AMP, AM_SMALL_AMP) * carrier + OFFSET
+
+    def analog_templates(self, dtype='float32'):
+        """Returns a read-only (3, samples_per_bit) array, the analog samples of
+        each symbol, or None if bits are not a whole number of samples long"""
+        if self.samples_per_bit.denominator != 1:
+            return None
+        dtype = np.dtype(dtype)
+        return self._cached(('analog', dtype), lambda: _scale(
+            self._analog_wave(np.arange(int(self.samples_per_bit))), dtype, AM_LARGE_AMP))
+
+    def analog_frame_templates(self, dtype='float32'):
+        """Returns a read-only (3, frame_samples) array, the analog samples of a
+        frame made of only one symbol, for each symbol"""
+        dtype = np.dtype(dtype)
+        return self._cached(('analog frame', dtype), lambda: _scale(
+            self._analog_wave(np.arange(self.frame_samples)), dtype, AM_LARGE_AMP))
+
+    def templates(self, kind, dtype=None):
+        """Per-symbol templates of a kind of signal, None if bits are not a whole number of samples long"""
+        dtype = self.dtype(kind, dtype)
+        return self.digital_templates(dtype) if kind == 'digital' else self.analog_templates(dtype)
+
+    def render(self, codes, kind='digital', dtype=None, out=None, positions=None):
+        """Render a frame of symbol codes into a signal array.
+
+        If positions is given, codes are the symbols at those bit positions and
+        only their samples are written into out, which holds a rendered frame.
+
+        >>> IRIG_B.render(np.array([2, 0, 1]), out=np.zeros(1000, 'int16'))[:30]
+        array([5, 5, 5, 5, 5, 5, 5, 5, 0, 0, 5, 5, 0, 0, 0, 0, 0, 0, 0, 0, 5, 5,
+               5, 5, 5, 0, 0, 0, 0, 0], dtype=int16)
+        """
+        dtype = self.dtype(kind, dtype)
+        if out is None:
+            out = np.empty(self.frame_length(kind), dtype=dtype)
+        codes = np.asarray(codes)
+        positions = np.arange(len(codes)) if positions is None else np.asarray(positions)
+
+        templates = self.templates(kind, dtype)
+        if templates is not None:
+            out.reshape(self.num_bits, -1)[positions] = templates[codes]
+        elif len(positions) == self.num_bits:
+            frame = self.analog_frame_templates(dtype)
+            symbol = np.empty(self.num_bits, dtype=np.intp)
+            symbol[positions] = codes
+            np.take(frame.ravel(), symbol[self.sample_bits] * self.frame_samples
+                    + np.arange(self.frame_samples), out=out)
+        else:
+            frame = self.analog_frame_templates(dtype)
+            bounds = self.bit_bounds
+            for position, code in zip(positions.tolist(), codes.tolist()):
+                start, stop = bounds[position], bounds[position + 1]
+                out[start:stop] = frame[code, start:stop]
+        return out
+
+
+IRIG_A = TimecodeFormat('A', 100, Fraction(1, 10), 10000)
+IRIG_B = TimecodeFormat('B', 100, 1, 1000)
+IRIG_D = TimecodeFormat('D', 60, 3600, 100)
+IRIG_E = TimecodeFormat('E', 100, 10, 100)
+IRIG_G = TimecodeFormat('G', 100, Fraction(1, 100), 100000)
+IRIG_H = TimecodeFormat('H', 60, 60, 100)
+
+FORMATS = {fmt.name: fmt for fmt in (IRIG_A, IRIG_B, IRIG_D, IRIG_E, IRIG_G, IRIG_H)}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,205 @@
+"""Bit-packed IRIG frames.
+
+An IrigFrame holds a frame as two integers instead of a '_01' bit string: the
+data bits, and a mask of the marker positions. Bit i of each is symbol i of
+the frame, which is also the bit order of the next_frame intbv that
+hardware.IrigTTLEncoder shifts out (bit 0 first).
+"""
+from datetime import date
+from functools import lru_cache
+
+from irig.utilities import BCD_FIELDS, BINARY_FIELDS, NUM_FRAME_BITS, irigtime
+
+# Bits of each BCD digit in frame order (most significant bit first), by width
+_DIGIT_BITS = {
+    width: [int(format(digit, '0%db' % width)[::-1], 2) for digit in range(2**width)]
+    for width in (2, 3, 4)
+}
+
+# Digit of each pattern of frame ordered bits, None for invalid BCD digits
+_BIT_DIGITS = {}
+for _width, _table in _DIGIT_BITS.items():
+    _BIT_DIGITS[_width] = [None] * 2**_width
+    for _digit, _bits in enumerate(_table[:10]):
+        _BIT_DIGITS[_width][_bits] = _digit
+
+# Frame bits of every value of each BCD field
+_FIELD_BITS = {}
+for _name, _digits in BCD_FIELDS.items():
+    _FIELD_BITS[_name] = []
+    for _value in range(10**len(_digits)):
+        _bits = 0
+        for _index, _width in _digits:
+            _value, _digit = divmod(_value, 10)
+            _bits |= _DIGIT_BITS[_width][_digit % 2**_width] << _index
+        _FIELD_BITS[_name].append(_bits)
+
+
+def _binary_field(value, name):
+    """Frame bits of a straight binary field holding value"""
+    bits = 0
+    for index, width in BINARY_FIELDS[name]:
+        bits |= (value & ((1 << width) - 1)) << index
+        value >>= width
+    return bits
+
+
+@lru_cache(maxsize=None)
+def _year_start(year):
+    """Ordinal of the day before January 1st of year"""
+    return date(year, 1, 1).toordinal() - 1
+
+
+@lru_cache(maxsize=None)
+def marker_mask(nbits=NUM_FRAME_BITS):
+    """Returns the mask of the marker positions (0, 9, 19 .. 99) of a frame
+    >>> format(marker_mask(20), '020b')
+    '10000000001000000001'
+    """
+    return sum(1 << i for i in range(nbits) if i == 0 or i % 10 == 9)
+
+
+class IrigFrame(object):
+    """An IRIG frame packed into integers.
+
+    >>> frame = IrigFrame.from_bits('_00010001_000100010_001000000_100100011_100000000_011000001_000000000_000000000_000000000_000000000_')
+    >>> frame.hour, frame.day_of_year, frame.sbs
+    (2, 239, 0)
+    >>> frame.to_irigtime()
+    irigtime(2016, 8, 26, 2, 11, 11)
+    >>> IrigFrame.from_bytes(frame.to_bytes()) == frame
+    True
+    >>> frame = IrigFrame.from_irigtime(irigtime(2016, 8, 26, 2, 11, 11), control=0x2A5A5)
+    >>> frame.sbs, hex(frame.control), frame.bits == irigtime.generate_bit_str(11, 11, 2, 239, 2016, 0x2A5A5)
+    (7871, '0x2a5a5', True)
+    """
+    __slots__ = ('value', 'markers', 'nbits')
+
+    def __init__(self, value=0, markers=None, nbits=NUM_FRAME_BITS):
+        self.value = value      # Data bits, 0 at marker positions
+        self.markers = marker_mask(nbits) if markers is None else markers
+        self.nbits = nbits
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Create an IrigFrame from a bit string"""
+        reverse = bits[::-1]
+        if reverse.strip('01_'):
+            raise ValueError('bits must only contain the symbols 01_')
+        value = int(reverse.replace('_', '0'), 2) if bits else 0
+        markers = int(reverse.replace('1', '0').replace('_', '1'), 2) if bits else 0
+        return cls(value, markers, len(bits))
+
+    @classmethod
+    def from_irigtime(cls, t, control=0):
+        """Create the IrigFrame of an irigtime (or datetime), with an 18 bit control functions payload"""
+        if t.year < 2000:
+            raise ValueError('year must be >= 2000')
+        if not 0 <= control < 1 << 18:
+            raise ValueError('control must be an 18 bit value')
+
+        return cls(_FIELD_BITS['second'][t.second] |
+                   _FIELD_BITS['minute'][t.minute] |
+                   _FIELD_BITS['hour'][t.hour] |
+                   _FIELD_BITS['day_of_year'][t.toordinal() - _year_start(t.year)] |
+                   _FIELD_BITS['year'][t.year % 100] |
+                   _binary_field(control, 'control') |
+                   _binary_field(t.second + 60 * t.minute + 3600 * t.hour, 'sbs'))
+
+    @classmethod
+    def from_intbv(cls, frame):
+        """Create an IrigFrame from a hardware frame, which has no markers"""
+        nbits = len(frame)
+        return cls(int(frame) & ~marker_mask(nbits), nbits=nbits)
+
+    @classmethod
+    def from_bytes(cls, data, nbits=NUM_FRAME_BITS):
+        """Create an IrigFrame from the little endian bytes of its data bits"""
+        return cls(int.from_bytes(data, 'little'), nbits=nbits)
+
+    def to_bytes(self):
+        """Returns the data bits as little endian bytes, 13 for a 100 bit frame.
+        Markers are not stored, they are assumed to be at the usual positions."""
+        return self.value.to_bytes((self.nbits + 7) // 8, 'little')
+
+    def to_intbv(self):
+        """Returns the frame as the next_frame intbv of hardware.IrigTTLEncoder"""
+        from myhdl import intbv
+        return intbv(self.value)[self.nbits:]
+
+    def to_irigtime(self):
+        """Returns the irigtime of the BCD fields of this frame"""
+        return irigtime.from_fields(*(self.field(name) for name in BCD_FIELDS))
+
+    @property
+    def bits(self):
+        """Returns the bit string of this frame"""
+        symbols = list(format(self.value, '0%db' % self.nbits)[::-1])
+        markers = self.markers
+        while markers:
+            lowest = markers & -markers
+            symbols[lowest.bit_length() - 1] = '_'
+            markers ^= lowest
+        return ''.join(symbols)
+
+    @property
+    def valid(self):
+        """True if the markers are exactly at the marker positions"""
+        return self.markers == marker_mask(self.nbits)
+
+    def field(self, name):
+        """Returns the value of a BCD field, the year counts from 2000.
+        Raises ValueError for an invalid BCD digit."""
+        value = 0
+        for index, width in reversed(BCD_FIELDS[name]):
+            digit = _BIT_DIGITS[width][(self.value >> index) & ((1 << width) - 1)]
+            if digit is None:
+                raise ValueError('invalid BCD digit in the %s field' % name)
+            value = value * 10 + digit
+        return value
+
+    @property
+    def sbs(self):
+        """The straight binary seconds of the day, read with one shift and mask.
+        The marker at bit 89 is always 0 in value, and is squeezed out."""
+        bits = (self.value >> 80) & 0x3FFFF
+        return (bits & 0x1FF) | ((bits >> 1) & 0x1FE00)
+
+    @property
+    def control(self):
+        """The 18 bit control functions payload"""
+        bits = (self.value >> 60) & 0x7FFFF
+        return (bits & 0x1FF) | ((bits >> 1) & 0x3FE00)
+
+    second = property(lambda self: self.field('second'))
+    minute = property(lambda self: self.field('minute'))
+    hour = property(lambda self: self.field('hour'))
+    day_of_year = property(lambda self: self.field('day_of_year'))
+    year = property(lambda self: 2000 + self.field('year'))
+
+    def __int__(self):
+        return self.value
+
+    def __str__(self):
+        return self.bits
+
+    def __eq__(self, other):
+        if not isinstance(other, IrigFrame):
+            return NotImplemented
+        return (self.value, self.markers, self.nbits) == (other.value, other.markers, other.nbits)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.value, self.markers, self.nbits))
+
+    def __repr__(self):
+        if self.nbits == NUM_FRAME_BITS and self.valid:
+            return 'IrigFrame(%#x)' % self.value
+        return 'IrigFrame(%#x, %#x, %d)' % (self.value, self.markers, self.nbits)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
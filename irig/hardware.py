@@ -1,6 +1,10 @@
+import math
+
 from myhdl import *
 
-def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bits=100):
+from irig.utilities import AM_LARGE_AMP, AM_SMALL_AMP
+
+def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bits=100, pulse_length=10, prescale=1):
   """ Takes an IRIG frame and encodes it based on IRIG TTL encoding.
 
   The data at marker positions (0,9,19..99) is ignored, and
@@ -10,9 +14,9 @@ def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bit
   For timecodes D and H, next_frame should only be 60 bits wide, all other
   timecodes are 100 bits.
 
-  Properties for various time codes:
+  Properties for various time codes, with the default pulse_length of 10:
 
-    Timecode    num_bits     clk
+    Timecode    num_bits     clk / prescale
       A           100       10  kHz
       B           100       1   kHz
       D           60        1/6 Hz
@@ -20,6 +24,8 @@ def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bit
       G           100       100 kHz
       H           60        10  Hz
 
+  So from a 100 MHz clock, prescale is 10000 for A, 100000 for B and 1000 for G.
+
   Ports
     irig_frame  [num_bits:0] <input>  : 100 or 60 bit irig frame to be encoded
     frame_latched            <output> : indicates when input frame is latched, and ready for next frame
@@ -27,7 +33,9 @@ def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bit
     enable                   <input>  : enable bit
 
   Parameters
-    num_bits  : number of bits in the IRIG frame
+    num_bits      : number of bits in the IRIG frame
+    pulse_length  : counts per IRIG bit, see BitEncoder
+    prescale      : clock cycles per count, see BitEncoder
 
   Waves:
                   _____________________________________________________________
@@ -39,10 +47,9 @@ def IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bit
   Follow this example to ensure the correct data is latched (we don't want input
   data changing while the module is latching the input).
   """
-  # pulse_length = Signal(intbv(10)[8:])  # Each IRIG bit will take 10 clock cycles
   irig_bit = Signal(intbv(0)[2:])
   request = Signal(bool(0))
-  inst1 = BitEncoder(irig_bit, request, ttl_out, enable, clk, rst)
+  inst1 = BitEncoder(irig_bit, request, ttl_out, enable, clk, rst, pulse_length, prescale)
   inst2 = FrameShiftRegister(next_frame, frame_latched, irig_bit, request, enable, clk, rst, num_bits)
 
   return inst1, inst2
@@ -108,7 +115,7 @@ def FrameShiftRegister(irig_frame, frame_latched, irig_bit, request, enable, clk
   return seq_logic, comb_logic
 
 
-def BitEncoder(irig_bit, request, ttl_out, enable, clk, rst, pulse_length=10):
+def BitEncoder(irig_bit, request, ttl_out, enable, clk, rst, pulse_length=10, prescale=1):
   """ Takes in a bit and drives it according to an IRIG specification
   There are three encoded symbols:
 
@@ -116,13 +123,18 @@ def BitEncoder(irig_bit, request, ttl_out, enable, clk, rst, pulse_length=10):
     Logic 1: 0.5 of pulse_length
     Logic 0: 0.2 of pulse_length
 
+  The pulse widths are rounded down to whole counts when the module is
+  elaborated, so they are constants in the logic, and the counter is just
+  wide enough for pulse_length.
+
   Ports:
     irig_bit     [1:0] <input>  : 0, 1, or 2 (2 representing marker)
     enable             <input>  : enable bit
-    request            <output> : goes high at the end of a bit time, indicating its time
-                                  for the next bit
+    request            <output> : goes high for a clock cycle at the end of a bit time,
+                                  indicating its time for the next bit
   Parameters
-    pulse_length       <input>  : bit pulse length, in number of clock cycles
+    pulse_length       : bit pulse length, in counts
+    prescale           : clock cycles per count, to encode slow timecodes from a fast clock
                ___________________________________________________________
   irig_bit     X______0____X_____1_____X_____1_____X____2______X__________X
                           _           _           _           _          _
@@ -130,48 +142,454 @@ def BitEncoder(irig_bit, request, ttl_out, enable, clk, rst, pulse_length=10):
                 __          _____       _____       ________    __
   ttl_out      |  |________|     |_____|     |_____|        |__|  |________
   """
+  zero_width = pulse_length * 2 // 10
+  one_width = pulse_length * 5 // 10
+  marker_width = pulse_length * 8 // 10
 
-  index = Signal(intbv(0)[4:])
+  index = Signal(intbv(0, min=0, max=pulse_length))
+  prescaler = Signal(intbv(0, min=0, max=max(2, prescale)))
   ttl_high = Signal(False)
 
   @always_comb
   def comb_logic():
-    a = (irig_bit == 0 and index < pulse_length * 0.2)
-    b = (irig_bit == 1 and index < pulse_length * 0.5)
-    c = (irig_bit == 2 and index < pulse_length * 0.8)
+    a = (irig_bit == 0 and index < zero_width)
+    b = (irig_bit == 1 and index < one_width)
+    c = (irig_bit == 2 and index < marker_width)
     ttl_high.next = a or b or c
 
   @always_seq(clk.posedge, reset=rst)
   def seq_logic():
     if enable:
-      index.next = (index + 1) % pulse_length
+      request.next = 0
 
-      if ttl_high:
-        ttl_out.next = 1
+      if prescale > 1 and prescaler != prescale - 1:
+        prescaler.next = prescaler + 1
       else:
-        ttl_out.next = 0
+        prescaler.next = 0
 
-      # Send request at end of bit
-      if index == pulse_length - 1:
-        request.next = 1
-      else:
-        request.next = 0
+        if index == pulse_length - 1:
+          index.next = 0
+        else:
+          index.next = index + 1
+
+        if ttl_high:
+          ttl_out.next = 1
+        else:
+          ttl_out.next = 0
+
+        # Send request at end of bit
+        if index == pulse_length - 1:
+          request.next = 1
 
   return seq_logic, comb_logic
 
 
+def IrigTTLDecoder(ttl_in, frame_out, frame_valid, enable, clk, rst, num_bits=100, pulse_length=10):
+  """ Decodes an IRIG TTL signal into frames, the reverse of IrigTTLEncoder.
+
+  The width of each pulse is measured with a counter and classified by
+  thresholds computed at elaboration time:
+
+    Marker:  at least 0.65 of pulse_length (nominal 0.8)
+    Logic 1: at least 0.35 of pulse_length (nominal 0.5)
+    Logic 0: at least 0.1 of pulse_length (nominal 0.2), shorter pulses are ignored
+
+  The decoder syncs on the double marker (P9 followed by P0) that starts a
+  frame, and shifts each symbol into a num_bits register, bit 0 first. When
+  the last symbol of a frame arrives the frame is presented on frame_out, in
+  the layout of IrigTTLEncoder's next_frame with 0 at marker positions, and
+  frame_valid is high for one clock cycle. A marker in the wrong place drops
+  sync until the next double marker.
+
+  Ports
+    ttl_in                   <input>  : irig ttl input, synchronous to clk
+    frame_out  [num_bits:0]  <output> : the last decoded frame
+    frame_valid              <output> : high for one cycle when frame_out is updated
+    enable                   <input>  : enable bit
+    clk                      <input>  : pulse_length cycles per IRIG bit
+
+  Parameters
+    num_bits     : number of bits in the IRIG frame
+    pulse_length : bit pulse length, in number of clock cycles
+                 __          _____       ________    ________    __
+  ttl_in       _|  |________|     |_____|        |__|        |__|  |_______
+  symbol              0           1          2           2        0
+                                                            _
+  frame_valid  ____________________________________________| |_____________
+  """
+  zero_min = max(1, pulse_length // 10)
+  one_min = pulse_length * 7 // 20
+  marker_min = pulse_length * 13 // 20
+
+  level = Signal(False)  # ttl_in on the previous cycle
+  count = Signal(intbv(0, min=0, max=pulse_length+1))  # cycles the pulse has been high
+  symbol = Signal(intbv(0)[2:])
+  symbol_valid = Signal(False)
+
+  shift = Signal(intbv(0)[num_bits:])
+  index = Signal(intbv(0, min=0, max=num_bits))
+  synced = Signal(False)
+  prev_marker = Signal(False)
+
+  @always_seq(clk.posedge, reset=rst)
+  def pulse_logic():
+    if enable:
+      level.next = ttl_in
+      symbol_valid.next = 0
+
+      if ttl_in and not level:  # rising edge
+        count.next = 1
+      elif ttl_in:
+        if count < pulse_length:
+          count.next = count + 1
+      elif level:  # falling edge, classify the pulse
+        if count >= marker_min:
+          symbol.next = 2
+        elif count >= one_min:
+          symbol.next = 1
+        else:
+          symbol.next = 0
+        symbol_valid.next = count >= zero_min
+
+  @always_seq(clk.posedge, reset=rst)
+  def frame_logic():
+    frame_valid.next = 0
+
+    if enable and symbol_valid:
+      is_marker = symbol == 2
+      prev_marker.next = is_marker
+
+      if synced and is_marker == (index == 0 or index % 10 == 9):
+        shift.next = concat(symbol[0], shift[num_bits:1])
+        if index == num_bits-1:
+          frame_out.next = concat(symbol[0], shift[num_bits:1])
+          frame_valid.next = 1
+          index.next = 0
+        else:
+          index.next = index + 1
+
+      elif is_marker and prev_marker:  # P0 after P9, start of a frame
+        synced.next = True
+        shift.next = concat(False, shift[num_bits:1])
+        index.next = 1
+
+      else:
+        synced.next = False
+
+  return pulse_logic, frame_logic
+
+
+def IrigTimeCounter(next_frame, frame_latched, load, load_frame, control, pps, clk, rst,
+                    num_bits=100, seconds_per_frame=1, frames_per_second=1, pps_sync=False):
+  """ Keeps the time of day in BCD and assembles the frames for IrigTTLEncoder.
+
+  The host loads a start time once, as a frame in the layout of next_frame
+  (eg IrigFrame.from_irigtime(t).to_intbv()) with load high for a cycle. The
+  counter then holds the time of the next frame to be sent, and advances it
+  every time frame_latched pulses, with rollover of seconds, minutes, hours,
+  the day of the year (365 or 366 days, every 4th year is a leap year) and the
+  2 digit year. next_frame is registered, and is updated within 2 cycles of
+  frame_latched, long before the encoder latches it.
+
+  With pps_sync the time is advanced a second by a rising edge of pps
+  instead, whatever seconds_per_frame, and holds the current second. Frames
+  latched during a second carry its time.
+
+  Ports
+    next_frame [num_bits:0] <output> : frame of the current time, markers 0
+    frame_latched           <input>  : from IrigTTLEncoder, the frame was latched
+    load                    <input>  : load the time of load_frame
+    load_frame [num_bits:0] <input>  : frame holding the start time
+    control    [18:0]       <input>  : control functions payload, 100 bit frames only
+    pps                     <input>  : pulse per second, used when pps_sync is set
+
+  Parameters
+    num_bits          : number of bits in the IRIG frame
+    seconds_per_frame : 1, 10 (E), 60 (H) or 3600 (D)
+    frames_per_second : frames sent in each second, 10 for A and 100 for G
+    pps_sync          : advance the time on pps rather than frame_latched
+  """
+  if seconds_per_frame not in (1, 10, 60, 3600):
+    raise ValueError('seconds_per_frame must be 1, 10, 60 or 3600')
+  # First digit to increment, and seconds added to SBS each tick. pps adds a second.
+  first = 0 if pps_sync else {1: 0, 10: 1, 60: 2, 3600: 4}[seconds_per_frame]
+  step = 1 if pps_sync else seconds_per_frame
+
+  # BCD digits, each as wide as its field
+  s_u, m_u, h_u, d_u, d_t, y_u, y_t = [Signal(intbv(0)[4:]) for i in range(7)]
+  s_t, m_t = [Signal(intbv(0)[3:]) for i in range(2)]
+  h_t, d_h = [Signal(intbv(0)[2:]) for i in range(2)]
+  sbs = Signal(intbv(0, min=0, max=86400))
+  leap = Signal(False)
+
+  tick = Signal(False)  # advance the time
+  pps_last = Signal(False)
+  frame_count = Signal(intbv(0, min=0, max=frames_per_second+1))
+  lower = Signal(intbv(0)[60:])  # first 60 bits of the frame
+
+  @always_seq(clk.posedge, reset=rst)
+  def tick_logic():
+    pps_last.next = pps
+    if load:
+      frame_count.next = 0
+    elif frame_latched:
+      if frame_count == frames_per_second - 1:
+        frame_count.next = 0
+      else:
+        frame_count.next = frame_count + 1
+
+  @always_comb
+  def tick_comb():
+    if pps_sync:
+      tick.next = pps and not pps_last
+    else:
+      tick.next = frame_latched and frame_count == frames_per_second - 1
+
+  @always_comb
+  def leap_logic():
+    if y_t[0] == 0:
+      leap.next = y_u == 0 or y_u == 4 or y_u == 8
+    else:
+      leap.next = y_u == 2 or y_u == 6
+
+  @always_seq(clk.posedge, reset=rst)
+  def count_logic():
+    if load:  # BCD digits are sent most significant bit first
+      s_u.next = concat(load_frame[1], load_frame[2], load_frame[3], load_frame[4])
+      s_t.next = concat(load_frame[6], load_frame[7], load_frame[8])
+      m_u.next = concat(load_frame[10], load_frame[11], load_frame[12], load_frame[13])
+      m_t.next = concat(load_frame[15], load_frame[16], load_frame[17])
+      h_u.next = concat(load_frame[20], load_frame[21], load_frame[22], load_frame[23])
+      h_t.next = concat(load_frame[25], load_frame[26])
+      d_u.next = concat(load_frame[30], load_frame[31], load_frame[32], load_frame[33])
+      d_t.next = concat(load_frame[35], load_frame[36], load_frame[37], load_frame[38])
+      d_h.next = concat(load_frame[40], load_frame[41])
+      y_u.next = concat(load_frame[50], load_frame[51], load_frame[52], load_frame[53])
+      y_t.next = concat(load_frame[55], load_frame[56], load_frame[57], load_frame[58])
+
+    elif tick:
+      carry = True
+      if first <= 0:
+        if s_u == 9:
+          s_u.next = 0
+        else:
+          s_u.next = s_u + 1
+          carry = False
+      if first <= 1 and carry:
+        if s_t == 5:
+          s_t.next = 0
+        else:
+          s_t.next = s_t + 1
+          carry = False
+      if first <= 2 and carry:
+        if m_u == 9:
+          m_u.next = 0
+        else:
+          m_u.next = m_u + 1
+          carry = False
+      if first <= 3 and carry:
+        if m_t == 5:
+          m_t.next = 0
+        else:
+          m_t.next = m_t + 1
+          carry = False
+      if carry:  # hours
+        if h_t == 2 and h_u == 3:
+          h_t.next = 0
+          h_u.next = 0
+        elif h_u == 9:
+          h_t.next = h_t + 1
+          h_u.next = 0
+          carry = False
+        else:
+          h_u.next = h_u + 1
+          carry = False
+      if carry:  # day of year, from 1
+        if d_h == 3 and d_t == 6 and ((leap and d_u == 6) or (not leap and d_u == 5)):
+          d_h.next = 0
+          d_t.next = 0
+          d_u.next = 1
+        else:
+          carry = False
+          if d_u == 9:
+            d_u.next = 0
+            if d_t == 9:
+              d_t.next = 0
+              d_h.next = d_h + 1
+            else:
+              d_t.next = d_t + 1
+          else:
+            d_u.next = d_u + 1
+      if carry:  # year since 2000
+        if y_u == 9:
+          y_u.next = 0
+          if y_t == 9:
+            y_t.next = 0
+          else:
+            y_t.next = y_t + 1
+        else:
+          y_u.next = y_u + 1
+
+  @always_comb
+  def lower_logic():
+    lower.next = concat(False, y_t[0], y_t[1], y_t[2], y_t[3], False, y_u[0], y_u[1], y_u[2], y_u[3],
+                        intbv(0)[8:], d_h[0], d_h[1], False, d_t[0], d_t[1], d_t[2], d_t[3],
+                        False, d_u[0], d_u[1], d_u[2], d_u[3], intbv(0)[3:], h_t[0], h_t[1],
+                        False, h_u[0], h_u[1], h_u[2], h_u[3], intbv(0)[2:], m_t[0], m_t[1], m_t[2],
+                        False, m_u[0], m_u[1], m_u[2], m_u[3], False, s_t[0], s_t[1], s_t[2],
+                        False, s_u[0], s_u[1], s_u[2], s_u[3], False)
+
+  if num_bits == 60:
+    @always_seq(clk.posedge, reset=rst)
+    def frame_logic():
+      next_frame.next = lower
+
+    return tick_logic, tick_comb, leap_logic, count_logic, lower_logic, frame_logic
+
+  # Straight binary seconds and control functions are sent least significant bit first
+  @always_seq(clk.posedge, reset=rst)
+  def sbs_logic():
+    if load:
+      sbs.next = concat(load_frame[98:90], load_frame[89:80])
+    elif tick:
+      if sbs >= 86400 - step:
+        sbs.next = sbs + step - 86400
+      else:
+        sbs.next = sbs + step
+
+  @always_seq(clk.posedge, reset=rst)
+  def frame_logic():
+    next_frame.next = concat(intbv(0)[2:], sbs[17:9], False, sbs[9:0], False,
+                             control[18:9], False, control[9:0], lower)
+
+  return tick_logic, tick_comb, leap_logic, count_logic, lower_logic, sbs_logic, frame_logic
+
+
+def IrigAMModulator(ttl_in, dac_out, enable, clk, rst, dac_bits=16, carrier_freq=1000, sample_freq=32000,
+                    phase_bits=30, rom_bits=8):
+  """ Modulates the ttl_out of IrigTTLEncoder onto a carrier, for a DAC
+
+  The carrier is made by a phase accumulator, advanced every clock cycle, and
+  a quarter wave sine ROM. The amplitude is that of a '1' bit (AM_LARGE_AMP)
+  while ttl_in is high and of a '0' bit (AM_SMALL_AMP) while it is low, and
+  only changes at the positive going zero crossings of the carrier, so every
+  carrier cycle has a single amplitude.
+
+  The clock runs at sample_freq, and IrigTTLEncoder should count carrier
+  cycles from the same clock, with a prescale of sample_freq / carrier_freq.
+  When that is a power of 2, the samples are those of
+  irigtime.analog_array, with integer dtypes of dac_bits.
+
+  Ports
+    ttl_in                  <input>  : encoded irig ttl, from IrigTTLEncoder
+    dac_out   [dac_bits:0]  <output> : signed samples, AM_LARGE_AMP is full scale
+    enable                  <input>  : enable bit
+
+  Parameters
+    dac_bits      : bits per DAC sample
+    carrier_freq  : carrier frequency, 1 kHz for B, 10 kHz for A and 100 kHz for G
+    sample_freq   : clock frequency, one sample is made every clock cycle
+    phase_bits    : width of the phase accumulator, at most 31
+    rom_bits      : address bits of the quarter wave ROM
+  """
+  quarter = 1 << rom_bits
+  step = int(round((1 << phase_bits) * carrier_freq / sample_freq))
+  wrap = (1 << phase_bits) - step
+  full_scale = (1 << (dac_bits - 1)) - 1
+
+  # Small then large amplitude quarter waves, including the peak
+  rom = tuple(int(round(amplitude * math.sin(i / (4 * quarter) * 2 * math.pi) * (full_scale / AM_LARGE_AMP)))
+              for amplitude in (AM_SMALL_AMP, AM_LARGE_AMP) for i in range(quarter + 1))
+
+  phase = Signal(intbv(0)[phase_bits:])
+  new_cycle = Signal(True)  # phase is the first sample of a carrier cycle
+  large = Signal(False)     # amplitude of the current carrier cycle
+  large_now = Signal(False)
+  index = Signal(intbv(0, min=0, max=quarter+1))
+  address = Signal(intbv(0, min=0, max=len(rom)))
+  value = Signal(intbv(0, min=0, max=full_scale+1))
+
+  @always_seq(clk.posedge, reset=rst)
+  def phase_logic():
+    if enable:
+      if phase >= wrap:
+        phase.next = phase - wrap
+        new_cycle.next = 1
+      else:
+        phase.next = phase + step
+        new_cycle.next = 0
+
+      if new_cycle:
+        large.next = ttl_in
+
+  @always_comb
+  def amplitude_logic():
+    if new_cycle:
+      large_now.next = ttl_in
+    else:
+      large_now.next = large
+
+  @always_comb
+  def index_logic():
+    if phase[phase_bits-2]:  # the second and fourth quarters run backwards
+      index.next = quarter - phase[phase_bits-2:phase_bits-2-rom_bits]
+    else:
+      index.next = phase[phase_bits-2:phase_bits-2-rom_bits]
+
+  @always_comb
+  def address_logic():
+    if large_now:
+      address.next = quarter + 1 + index
+    else:
+      address.next = index
+
+  @always_comb
+  def rom_logic():
+    value.next = rom[int(address)]
+
+  @always_seq(clk.posedge, reset=rst)
+  def dac_logic():
+    if enable:
+      if phase[phase_bits-1]:  # second half of the cycle
+        dac_out.next = -value
+      else:
+        dac_out.next = value
+
+  return phase_logic, amplitude_logic, index_logic, address_logic, rom_logic, dac_logic
+
+
 # Conversion to Verilog Functions
 def convertFrameShiftRegister():
   num_bits=100
-  rst = ResetSignal(0, active=1, async=True)
+  rst = ResetSignal(0, active=1, isasync=True)
   request, frame_latched, enable, clk = [Signal(bool(0)) for i in range(4)]
   irig_frame = Signal(intbv(0)[num_bits:])  # assume 100 bits
   irig_bit = Signal(intbv(0)[2:])
   toVerilog(FrameShiftRegister, irig_frame, frame_latched, irig_bit, request, enable, clk, rst, num_bits=num_bits)
 
-def convertBitEncoder():
-  rst = ResetSignal(0, active=1, async=True)
+def convertBitEncoder(pulse_length=10, prescale=1):
+  rst = ResetSignal(0, active=1, isasync=True)
   request, ttl_out, enable, clk = [Signal(bool(0)) for i in range(4)]
-  pulse_length = Signal(intbv(0)[7:])
   irig_bit = Signal(intbv(0)[2:])
-  toVerilog(BitEncoder, irig_bit, request, ttl_out, enable, clk, rst)
+  toVerilog(BitEncoder, irig_bit, request, ttl_out, enable, clk, rst, pulse_length=pulse_length, prescale=prescale)
+
+def convertIrigTTLDecoder():
+  num_bits=100
+  rst = ResetSignal(0, active=1, isasync=True)
+  ttl_in, frame_valid, enable, clk = [Signal(bool(0)) for i in range(4)]
+  frame_out = Signal(intbv(0)[num_bits:])
+  toVerilog(IrigTTLDecoder, ttl_in, frame_out, frame_valid, enable, clk, rst, num_bits=num_bits)
+
+def convertIrigTimeCounter():
+  num_bits=100
+  rst = ResetSignal(0, active=1, isasync=True)
+  frame_latched, load, pps, clk = [Signal(bool(0)) for i in range(4)]
+  next_frame, load_frame = [Signal(intbv(0)[num_bits:]) for i in range(2)]
+  control = Signal(intbv(0)[18:])
+  toVerilog(IrigTimeCounter, next_frame, frame_latched, load, load_frame, control, pps, clk, rst, num_bits=num_bits)
+
+def convertIrigAMModulator(dac_bits=16):
+  rst = ResetSignal(0, active=1, isasync=True)
+  ttl_in, enable, clk = [Signal(bool(0)) for i in range(3)]
+  dac_out = Signal(intbv(0, min=-2**(dac_bits-1), max=2**(dac_bits-1)))
+  toVerilog(IrigAMModulator, ttl_in, dac_out, enable, clk, rst, dac_bits=dac_bits)
@@ -0,0 +1,165 @@
+"""Sparse time index of long recordings.
+
+A FrameIndex decodes one frame in every `every` frames of a recording and
+keeps the sample offset and time of each. Seeking to a time is then a binary
+search over the index, interpolation between its entries and the decoding of
+a couple of frames to find the exact offset. The index is kept in a sidecar
+file next to the recording, and is extended when the recording grows.
+"""
+import math
+import os
+
+import numpy as np
+
+from irig.decode import decode_signal
+from irig.formats import IRIG_B
+from irig.recording import read_signal
+
+EVERY = 60          # Frames between the entries of an index
+SIDECAR = '.idx.npz'
+
+
+class FrameIndex(object):
+    """A sparse index of the frame times of a recording.
+
+    The recording is read with recording.read_signal, and the parameters are
+    those of read_signal.
+
+    >>> import os, tempfile
+    >>> from irig.recording import write_signal
+    >>> from irig.utilities import irigtime
+    >>> path = os.path.join(tempfile.mkdtemp(), 'irig.raw')
+    >>> write_signal(path, irigtime(2016, 7, 20, 1, 49), 600, format='raw', kind='digital')
+    600
+    >>> index = FrameIndex.open(path, every=100)
+    >>> len(index), index.seek(irigtime(2016, 7, 20, 1, 55, 30))
+    (6, 390000)
+    >>> write_signal(path, irigtime(2016, 7, 20, 1, 49), 300, format='raw', kind='digital', frame_offset='end')
+    900
+    >>> len(FrameIndex.open(path, every=100))
+    9
+    """
+    def __init__(self, path, every=EVERY, kind='digital', dtype=None, sample_rate=None,
+                 channel=0, timecode=IRIG_B):
+        self.path = path
+        self.every = every
+        self.kind = kind
+        self.dtype = dtype
+        self.sample_rate = sample_rate
+        self.channel = channel
+        self.timecode = timecode
+        self.offsets = np.empty(0, dtype=np.int64)        # Sample offset of each indexed frame
+        self.times = np.empty(0, dtype='datetime64[s]')   # Time of each indexed frame
+        self.scanned = 0                                  # Sample offset of the next window to scan
+
+    @property
+    def sidecar(self):
+        """Path of the index file of the recording"""
+        return self.path + SIDECAR
+
+    @property
+    def _key(self):
+        """The parameters an index file must have been built with"""
+        return repr((self.every, self.kind, self.dtype and str(np.dtype(self.dtype)), self.sample_rate,
+                     self.channel, self.timecode.name, self.timecode.sample_freq))
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Load the index of a recording from its sidecar file, or build it,
+        and scan the part of the recording added since it was saved"""
+        index = cls(path, **kwargs)
+        if os.path.exists(index.sidecar):
+            index.load()
+        if index.update():
+            index.save()
+        return index
+
+    def load(self):
+        """Load the sidecar file, unless it was built with other parameters"""
+        with np.load(self.sidecar) as data:
+            if str(data['key']) != self._key:
+                return
+            self.offsets = data['offsets']
+            self.times = data['times'].astype('datetime64[s]')
+            self.scanned = int(data['scanned'])
+
+    def save(self):
+        """Write the sidecar file, replacing it atomically"""
+        partial = self.sidecar + '.partial'
+        with open(partial, 'wb') as f:
+            np.savez(f, key=self._key, offsets=self.offsets, times=self.times.astype(np.int64),
+                     scanned=self.scanned)
+        os.replace(partial, self.sidecar)
+
+    def _signal(self):
+        """Returns the samples, timecode and frame length of the recording"""
+        signal, rate = read_signal(self.path, self.kind, self.dtype, self.sample_rate, self.channel, self.timecode)
+        timecode = self.timecode
+        if self.kind == 'analog' and rate != timecode.sample_freq:
+            timecode = timecode.with_sample_freq(rate)
+        return signal, timecode, math.ceil(rate * timecode.frame_duration)
+
+    def update(self):
+        """Index the part of the recording after the last scan, returns the number of new entries.
+
+        Windows of two frames (and a couple of bits) every `every` frames are
+        decoded, and the first good frame of each is indexed.
+        """
+        signal, timecode, frame_length = self._signal()
+        if len(self.offsets) and self.offsets[-1] >= len(signal):
+            # The recording was cut, start again
+            self.__init__(self.path, self.every, self.kind, self.dtype, self.sample_rate,
+                          self.channel, self.timecode)
+
+        stride = self.every * frame_length
+        window = 2 * frame_length + 2 * math.ceil(frame_length / timecode.num_bits)
+        offsets, times = [self.offsets], [self.times]
+        while self.scanned + window <= len(signal):
+            start = self.scanned
+            found, decoded, flags = decode_signal(np.asarray(signal[start:start + window]), self.kind, timecode)
+            good = np.flatnonzero(flags == 0)[:1]
+            offsets.append(found[good] + start)
+            times.append(decoded[good])
+            self.scanned += stride
+
+        count = sum(map(len, offsets)) - len(self.offsets)
+        self.offsets, self.times = np.concatenate(offsets).astype(np.int64), np.concatenate(times)
+        return count
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def estimate(self, time):
+        """Returns the estimated sample offset of the frame at a time, from the
+        entries around it and the sample rate measured between them"""
+        if not len(self.offsets):
+            raise KeyError('%s has no index entries' % self.path)
+        t = np.datetime64(time, 's')
+        i = max(0, np.searchsorted(self.times, t, side='right') - 1)
+        j = i + 1 if i + 1 < len(self.times) else i - 1
+        if j >= 0 and self.times[j] != self.times[i]:
+            rate = (self.offsets[j] - self.offsets[i]) / ((self.times[j] - self.times[i]) / np.timedelta64(1, 's'))
+        else:
+            rate = self._signal()[2] / self.timecode.frame_duration
+        return int(round(self.offsets[i] + (t - self.times[i]) / np.timedelta64(1, 's') * rate))
+
+    def seek(self, time):
+        """Returns the sample offset of the first frame at a time (an irigtime,
+        datetime or datetime64), raises KeyError if it is not in the recording"""
+        t = np.datetime64(time, 's')
+        signal, timecode, frame_length = self._signal()
+        # Frames shorter than a second share its time, so decode a second of
+        # frames either side of the estimate, on frame boundaries of the recording
+        span = math.ceil(1 / timecode.frame_duration) + 1
+        start = max(0, (self.estimate(t) // frame_length - span) * frame_length)
+        stop = start + (2 * span + 1) * frame_length + 2 * math.ceil(frame_length / timecode.num_bits)
+        offsets, times, flags = decode_signal(np.asarray(signal[start:stop]), self.kind, timecode)
+        found = np.flatnonzero((times == t) & (flags == 0))
+        if not len(found):
+            raise KeyError('%s is not in %s' % (t, self.path))
+        return int(offsets[found[0]] + start)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,223 @@
+"""Opt-in instrumentation of the streaming decoders.
+
+A DecoderMetrics given to a DigitalDecoder or AnalogDecoder counts the
+samples, pulses, frames and errors of the stream, keeps a histogram of the
+pulse widths of each class of symbol and the time spent in each decoding
+stage. Decoders update it once per chunk fed, and the stage timings once per
+frame, so a decoder without one only pays for checking that it has none.
+
+snapshot() is a plain dict, eg to log as JSON, and prometheus() is the
+Prometheus text format, which serve() publishes over HTTP for scraping.
+"""
+import threading
+import time
+
+import numpy as np
+
+from irig.formats import IRIG_B
+
+# Counters, and their help text
+COUNTERS = {
+    'samples': 'Samples fed to the decoder',
+    'pulses': 'Pulses measured, glitches included',
+    'glitches': 'Pulses too short to be a symbol, which were discarded',
+    'frames': 'Frames decoded',
+    'rejected': 'Synchronized frames that failed to decode',
+    'sync_losses': 'Misplaced markers that broke frame sync',
+    'tracked': 'Frames that matched their prediction',
+    'mispredictions': 'Frames that did not match their prediction',
+}
+
+# Decoding stages: carrier envelopes (analog only), pulse measurement, BCD
+# fields, datetime from the fields, and prediction of the next frame
+STAGES = ('envelope', 'demodulate', 'bcd', 'datetime', 'predict')
+
+# Classes of pulses, in symbol code order from -1 (too short to be a symbol)
+CLASSES = ('glitch', '0', '1', 'marker')
+
+
+class DecoderMetrics(object):
+    """Counters, pulse width histograms and stage timings of decoders.
+
+    A DecoderMetrics may be shared by decoders in several threads. Pulse
+    widths are in samples of the digital signal, carrier cycles for an
+    AnalogDecoder. The histograms have a bucket per width up to max_width,
+    3 bits of IRIG-B by default, and wider pulses, eg a lost signal, are
+    counted as inf.
+
+    >>> from irig.decode import DigitalDecoder
+    >>> from irig.render import encode_range
+    >>> from irig.utilities import irigtime
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 3, flat=True)
+    >>> signal[1055] = 5  # glitch
+    >>> metrics = DecoderMetrics()
+    >>> decoder = DigitalDecoder(metrics=metrics)
+    >>> for chunk in np.array_split(signal, 4):
+    ...     _ = decoder.feed(chunk)
+    >>> snapshot = metrics.snapshot()
+    >>> snapshot['counters']
+    {'samples': 3000, 'pulses': 301, 'glitches': 1, 'frames': 2, 'rejected': 0, 'sync_losses': 0, 'tracked': 1, 'mispredictions': 0}
+    >>> snapshot['pulse_widths']
+    {'glitch': {1: 1}, '0': {2: 218}, '1': {5: 49}, 'marker': {8: 33}}
+    >>> snapshot['stages']['bcd']['calls'], snapshot['stages']['predict']['calls']
+    (1, 2)
+
+    A pulse of any width takes no more room, nor lines of output:
+
+    >>> lines = len(metrics.prometheus().splitlines())
+    >>> metrics.pulses([2000000], [2])
+    >>> metrics.snapshot()['pulse_widths']['marker']
+    {8: 33, inf: 1}
+    >>> metrics._widths.shape, len(metrics.prometheus().splitlines()) == lines
+    ((4, 32), True)
+    """
+    def __init__(self, max_width=3 * IRIG_B.pulse_width):
+        self.max_width = max_width
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.seconds = dict.fromkeys(STAGES, 0.0)  # Time spent in each stage
+        self.calls = dict.fromkeys(STAGES, 0)      # Times each stage ran
+        # Pulses of each class and width, from 0 to max_width and then wider
+        self._widths = np.zeros((len(CLASSES), max_width + 2), dtype=np.int64)
+        self._sums = np.zeros(len(CLASSES), dtype=np.int64)  # Sum of the widths of each class
+        self._lock = threading.Lock()
+
+    def count(self, **counts):
+        """Add to counters"""
+        with self._lock:
+            for name, value in counts.items():
+                self.counters[name] += value
+
+    def stage(self, name, start):
+        """Add the time since start, a time.perf_counter() time, to a stage.
+        Returns the current time, the start of the next stage."""
+        now = time.perf_counter()
+        with self._lock:
+            self.seconds[name] += now - start
+            self.calls[name] += 1
+        return now
+
+    def pulses(self, widths, codes):
+        """Add pulses to the histograms, given their widths and symbol codes, -1 for glitches"""
+        widths = np.asarray(widths, dtype=np.int64)
+        if not len(widths):
+            return
+        classes = np.asarray(codes) + 1
+        size = self._widths.shape[1]
+        counts = np.bincount(classes * size + np.minimum(widths, size - 1), minlength=len(CLASSES) * size)
+        sums = np.bincount(classes, widths, minlength=len(CLASSES)).astype(np.int64)
+        with self._lock:
+            self._widths += counts.reshape(len(CLASSES), size)
+            self._sums += sums
+            self.counters['pulses'] += len(widths)
+            self.counters['glitches'] += int(counts[:size].sum())
+
+    def snapshot(self):
+        """Returns a copy of the metrics as a dict of plain values"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'stages': {name: {'seconds': self.seconds[name], 'calls': self.calls[name]} for name in STAGES},
+                'pulse_widths': {name: {(width if width <= self.max_width else float('inf')): count
+                                        for width, count in enumerate(row) if count}
+                                 for name, row in zip(CLASSES, self._widths.tolist())},
+                'pulse_width_sums': dict(zip(CLASSES, self._sums.tolist())),
+            }
+
+    def prometheus(self, prefix='irig_decoder'):
+        """Returns the metrics in the Prometheus text format, see prometheus()"""
+        return prometheus(self, prefix)
+
+
+def _labels(**labels):
+    """Format Prometheus labels, escaping their values"""
+    if not labels:
+        return ''
+    escape = lambda value: str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{%s}' % ','.join('%s="%s"' % (name, escape(value)) for name, value in labels.items())
+
+
+def prometheus(metrics, prefix='irig_decoder'):
+    """Format metrics in the Prometheus text format. metrics is a
+    DecoderMetrics, or a dict of them by channel name, which is the channel
+    label of their samples.
+
+    >>> metrics = DecoderMetrics(max_width=3)
+    >>> metrics.count(frames=3)
+    >>> metrics.pulses([2, 3, 1, 9], [0, 0, -1, 0])
+    >>> text = prometheus({'ch0': metrics})
+    >>> print('\\n'.join(line for line in text.splitlines() if '_frames_' in line or 'symbol="0"' in line))
+    # HELP irig_decoder_frames_total Frames decoded
+    # TYPE irig_decoder_frames_total counter
+    irig_decoder_frames_total{channel="ch0"} 3
+    irig_decoder_pulse_width_bucket{channel="ch0",symbol="0",le="1"} 0
+    irig_decoder_pulse_width_bucket{channel="ch0",symbol="0",le="2"} 1
+    irig_decoder_pulse_width_bucket{channel="ch0",symbol="0",le="3"} 2
+    irig_decoder_pulse_width_bucket{channel="ch0",symbol="0",le="+Inf"} 3
+    irig_decoder_pulse_width_sum{channel="ch0",symbol="0"} 14
+    irig_decoder_pulse_width_count{channel="ch0",symbol="0"} 3
+    """
+    channels = list(metrics.items()) if isinstance(metrics, dict) else [(None, metrics)]
+    snapshots = [({'channel': channel} if channel is not None else {}, m.snapshot()) for channel, m in channels]
+    lines = []
+
+    for name, text in COUNTERS.items():
+        metric = '%s_%s_total' % (prefix, name)
+        lines += ['# HELP %s %s' % (metric, text), '# TYPE %s counter' % metric]
+        lines += ['%s%s %d' % (metric, _labels(**labels), snapshot['counters'][name])
+                  for labels, snapshot in snapshots]
+
+    for name, unit, text in (('seconds', 'seconds', 'Time spent in each decoding stage'),
+                             ('calls', 'calls', 'Times each decoding stage ran')):
+        metric = '%s_stage_%s_total' % (prefix, unit)
+        lines += ['# HELP %s %s' % (metric, text), '# TYPE %s counter' % metric]
+        lines += ['%s%s %r' % (metric, _labels(**labels, stage=stage), snapshot['stages'][stage][name])
+                  for labels, snapshot in snapshots for stage in STAGES]
+
+    metric = '%s_pulse_width' % prefix
+    lines += ['# HELP %s Pulse widths of each class of symbol, in samples' % metric,
+              '# TYPE %s histogram' % metric]
+    for (labels, snapshot), (_, m) in zip(snapshots, channels):
+        buckets = range(1, m.max_width + 1)
+        for symbol in CLASSES:
+            counts = snapshot['pulse_widths'][symbol]
+            cumulative = np.cumsum([counts.get(width, 0) for width in range(m.max_width + 1)])[1:].tolist()
+            lines += ['%s_bucket%s %d' % (metric, _labels(**labels, symbol=symbol, le=width), count)
+                      for width, count in zip(buckets, cumulative)]
+            total = sum(counts.values())
+            lines += ['%s_bucket%s %d' % (metric, _labels(**labels, symbol=symbol, le='+Inf'), total),
+                      '%s_sum%s %d' % (metric, _labels(**labels, symbol=symbol), snapshot['pulse_width_sums'][symbol]),
+                      '%s_count%s %d' % (metric, _labels(**labels, symbol=symbol), total)]
+    return '\n'.join(lines) + '\n'
+
+
+def serve(metrics, port=9464, host='127.0.0.1', prefix='irig_decoder'):
+    """Serve metrics in the Prometheus text format over HTTP, from a daemon
+    thread. metrics is as for prometheus(). Returns the server, call its
+    shutdown() method to stop it.
+
+    >>> from urllib.request import urlopen
+    >>> metrics = DecoderMetrics()
+    >>> metrics.count(frames=3)
+    >>> server = serve(metrics, port=0)
+    >>> text = urlopen('http://127.0.0.1:%d/metrics' % server.server_address[1]).read().decode()
+    >>> 'irig_decoder_frames_total 3' in text.splitlines()
+    True
+    >>> server.shutdown()
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = prometheus(metrics, prefix).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
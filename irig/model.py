@@ -0,0 +1,86 @@
+"""Cycle accurate model of hardware.IrigTTLEncoder.
+
+Computes the ttl_out and frame_latched outputs of the encoder (FrameShiftRegister
+driving BitEncoder) for a whole batch of frames at once, so test benches only
+need to compare the edges of the simulated outputs against it, and the model
+itself can be checked against the software renderer over many frames.
+
+Cycle 0 is the first rising clock edge with enable high, and each output array
+holds the value registered at every rising edge from there on. Each frame is
+latched from next_frame at the cycle that frame_latched is high.
+"""
+import numpy as np
+
+from irig.utilities import BIT_WIDTH, PULSE_WIDTH, SYMBOLS
+
+
+def symbol_stream(frames, num_bits=100):
+    """The symbol codes shifted out by FrameShiftRegister for a batch of frames
+    (ints in the bit order of next_frame), after the marker it starts with
+
+    >>> symbol_stream([0b1010, 0b1], num_bits=10).tolist()
+    [2, 2, 1, 0, 1, 0, 0, 0, 0, 0, 2, 2, 0, 0, 0, 0, 0, 0, 0, 0, 2]
+    """
+    size = (num_bits + 7) // 8
+    data = np.frombuffer(b''.join(int(frame).to_bytes(size, 'little') for frame in frames), dtype=np.uint8)
+    codes = np.unpackbits(data, bitorder='little').reshape(len(frames), size * 8)[:, :num_bits]
+    positions = np.arange(num_bits)
+    codes[:, (positions == 0) | (positions % 10 == 9)] = SYMBOLS.index('_')
+    return np.concatenate([[SYMBOLS.index('_')], codes.ravel()]).astype(np.uint8)
+
+
+def encoder_model(frames, num_bits=100, pulse_length=10, prescale=1):
+    """Returns the ttl_out and frame_latched of IrigTTLEncoder as boolean
+    arrays, one value per clock cycle, until the end of the last frame.
+
+    The encoder sends a marker before the first frame, so the frames follow a
+    bit later than in the software signal:
+
+    >>> from datetime import timedelta
+    >>> from irig.frame import IrigFrame
+    >>> from irig.render import encode_range
+    >>> from irig.utilities import irigtime
+    >>> start = irigtime(2016, 12, 31, 23, 59, 50)
+    >>> frames = [int(IrigFrame.from_irigtime(start + timedelta(seconds=s))) for s in range(20)]
+    >>> ttl, latched = encoder_model(frames)
+    >>> np.flatnonzero(latched)[:3].tolist()
+    [11, 1010, 2010]
+    >>> np.array_equal(ttl[10:], encode_range(start, 20, flat=True) != 0)
+    True
+    """
+    # Pulse width of each symbol code, in counts
+    widths = np.array([BIT_WIDTH[symbol] * pulse_length // PULSE_WIDTH for symbol in SYMBOLS])
+    symbols = symbol_stream(frames, num_bits)
+    counts = len(symbols) * pulse_length
+    cycles = counts * prescale
+
+    # BitEncoder counts at the end of every prescale cycles, and registers the
+    # pulse for its index before the count. FrameShiftRegister moves to the
+    # next symbol the cycle after each request, which without a prescaler is
+    # too late for the first count of the symbol (whose pulse is always high
+    # for the usual widths, as they are at least one count).
+    k = np.arange(counts)
+    current = np.maximum(0, (k - (prescale == 1)) // pulse_length)
+    ttl = np.zeros(cycles, dtype=bool)
+    ttl[prescale - 1:] = np.repeat(k % pulse_length < widths[symbols[current]], prescale)[:cycles - prescale + 1]
+
+    # The first frame is latched the cycle after the first request is seen,
+    # the others at the request that ends the last bit of a frame
+    latched = np.zeros(cycles, dtype=bool)
+    latched[pulse_length * prescale + 1] = True
+    latched[(np.arange(1, len(frames)) * num_bits + 1) * pulse_length * prescale] = True
+    return ttl, latched
+
+
+def transitions(signal):
+    """The cycles a registered output rises and falls at, from low at reset
+    >>> transitions(np.array([1, 1, 0, 0, 1, 0], dtype=bool))
+    (array([0, 4]), array([2, 5]))
+    """
+    changes = np.diff(signal.astype(np.int8), prepend=0)
+    return np.flatnonzero(changes > 0), np.flatnonzero(changes < 0)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
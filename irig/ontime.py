@@ -0,0 +1,163 @@
+"""On-time edges of decoded frames, to a fraction of a sample, and the offset
+of the capture clock from IRIG time.
+
+The on-time point of a frame is the leading edge of its reference marker P0,
+which follows the P9 marker of the previous frame. In a digital signal it is
+where the rising edge crosses the midpoint of the signal levels, interpolated
+linearly between the samples either side, so a hard step between samples i-1
+and i is at i - 0.5. In an analog signal it is the positive going zero crossing
+of the carrier at the start of P0, located from the carrier phase estimated
+over the cycles around it.
+"""
+import math
+
+import numpy as np
+
+from irig.decode import decode_digital, decode_signal
+from irig.formats import IRIG_B
+
+
+def refine_edges(signal, rising, levels=None, window=2):
+    """Sub-sample positions of rising edges of a digital signal.
+
+    rising are sample indices near the edges, eg those of decode_digital. The
+    crossing of the midpoint of levels (the 5th and 95th percentiles of signal
+    by default) nearest each index, within window samples of it, is
+    interpolated between the samples either side. Edges without a crossing
+    there are NaN.
+
+    >>> refine_edges([0, 0, 1, 4, 5, 5], [3], levels=(0, 5))
+    array([2.5])
+    """
+    signal = np.asarray(signal, dtype=np.float64)
+    rising = np.asarray(rising, dtype=np.intp)
+    if levels is None:
+        levels = np.percentile(signal, [5, 95]) if len(signal) else (0, 0)
+    middle = (levels[0] + levels[1]) / 2
+
+    offsets = np.arange(-window - 1, window + 1)
+    index = np.clip(rising[:, None] + offsets, 0, max(len(signal) - 1, 0))
+    samples = signal[index] if len(signal) else np.zeros(index.shape)
+    crossing = (samples[:, :-1] < middle) & (samples[:, 1:] >= middle)
+    nearest = np.argmin(np.where(crossing, np.abs(offsets[:-1] + 0.5), np.inf), axis=1)
+
+    rows = np.arange(len(rising))
+    before, after = samples[rows, nearest], samples[rows, nearest + 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        positions = index[rows, nearest] + (middle - before) / (after - before)
+    return np.where(crossing[rows, nearest], positions, np.nan)
+
+
+def carrier_edges(signal, starts, timecode=IRIG_B, cycles=None, first=0):
+    """Sub-sample positions of the on-time points of frames of an analog signal.
+
+    starts are sample indices within half a carrier cycle or so of the start of
+    each frame, eg those of decode_signal. The carrier phase is the phase of
+    the component at the carrier frequency of the cycles samples either side of
+    each start (a bit, pulse_width cycles, by default). Of the positive going
+    zero crossings it puts near the start, the on-time point is the one with
+    the largest rise in amplitude from the cycle before it to the cycle after.
+    Frames too close to either end of signal are NaN. first is the index of
+    signal[0] in the capture, whose sample 0 is at zero carrier phase, when
+    signal is a window of it.
+
+    >>> from irig.render import encode_range
+    >>> from irig.utilities import irigtime
+    >>> timecode = IRIG_B.with_sample_freq(44100)
+    >>> signal = encode_range(irigtime(2016, 7, 20, 1, 49), 3, timecode=timecode, kind='analog', flat=True)
+    >>> delayed = np.interp(np.arange(len(signal)) - 10.3, np.arange(len(signal)), signal)
+    >>> carrier_edges(delayed, [44110, 88210], timecode).round(2)
+    array([44110.3, 88210.3])
+    """
+    signal = np.asarray(signal)
+    starts = np.asarray(starts, dtype=np.int64)
+    period = float(timecode.samples_per_cycle)
+    half = int(math.ceil((cycles or timecode.pulse_width) * period))
+    inside = (starts >= half) & (starts + half <= len(signal))
+    positions = np.full(len(starts), np.nan)
+    if not inside.any():
+        return positions
+    starts = starts[inside]
+
+    offsets = np.arange(-half, half)
+    window = signal[starts[:, None] + offsets].astype(np.float64)
+    window -= window.mean(axis=1, keepdims=True)
+
+    # Carrier phase, in cycles, of each sample of the windows, from exact integer phase of the starts
+    fc, fs = timecode.carrier_freq, timecode.sample_freq
+    base = (starts + first) * fc % fs / fs
+    phase = base[:, None] + offsets * (fc / fs)
+    component = (window * np.exp(-2j * np.pi * phase)).sum(axis=1)
+
+    # A*sin(2 pi (phase - zero)) has a component of phase -2 pi zero - pi/2
+    zero = -np.angle(component) / (2 * np.pi) - 0.25
+    nearest = (zero - base + 0.5) % 1 - 0.5  # crossing nearest each start, in cycles from it
+
+    # Pick the crossing with the largest step in amplitude, from cycle energies in the windows
+    cycle = int(round(period))
+    energy = np.concatenate((np.zeros((len(starts), 1)), np.cumsum(window * window, axis=1)), axis=1)
+    candidates = (nearest[:, None] + np.arange(-1, 2)) * period
+    at = np.clip(np.rint(candidates).astype(np.intp) + half, cycle, 2 * half - cycle)
+    rows = np.arange(len(starts))[:, None]
+    step = (energy[rows, at + cycle] - energy[rows, at]) - (energy[rows, at] - energy[rows, at - cycle])
+    best = candidates[np.arange(len(starts)), np.argmax(step, axis=1)]
+
+    positions[inside] = starts + best
+    return positions
+
+
+def on_time_edges(signal, kind='digital', timecode=IRIG_B, samples_per_bit=None):
+    """Decode the frames of a whole signal array, and locate their on-time points.
+
+    A digital signal is decoded with decode_digital and its edges refined with
+    refine_edges, an analog one (sampled at timecode.sample_freq) with
+    decode_signal and carrier_edges. Returns the sub-sample position of the
+    on-time point of each frame, the decoded times and the quality flags.
+
+    >>> from irig.render import encode_range
+    >>> from irig.utilities import irigtime
+    >>> signal = np.repeat(encode_range(irigtime(2016, 7, 20, 1, 49), 3, flat=True), 4)[1000:]
+    >>> positions, times, flags = on_time_edges(signal, samples_per_bit=40)
+    >>> positions, times
+    (array([2999.5, 6999.5]), array(['2016-07-20T01:49:01', '2016-07-20T01:49:02'],
+          dtype='datetime64[s]'))
+    """
+    if kind == 'digital':
+        starts, times, flags, _ = decode_digital(signal, timecode, samples_per_bit)
+        return refine_edges(signal, starts), times, flags
+    starts, times, flags = decode_signal(signal, 'analog', timecode)
+    return carrier_edges(signal, starts, timecode), times, flags
+
+
+def clock_offsets(positions, times, sample_rate, start=0, timecode=IRIG_B):
+    """Offsets in seconds of the capture clock from IRIG time at on-time points.
+
+    positions are the sample positions of the on-time points of frames and
+    times their decoded times, as from on_time_edges. start is the time of
+    sample 0 on the capture clock, a datetime64 or seconds since the epoch,
+    and sample_rate its rate in samples per second. An offset is positive
+    when the capture clock is ahead. Frames that were not decoded are NaN.
+
+    Frames shorter than a second only carry the second they are in: their
+    on-time is that of the frame of the second nearest the capture time, which
+    holds while the offset is under half a frame.
+
+    >>> times = np.array(['2016-07-20T01:49:01', '2016-07-20T01:49:02', 'NaT'], dtype='M8[s]')
+    >>> start = np.datetime64('2016-07-20T01:49:00.75')
+    >>> clock_offsets([249.5, 1249.5, 2249.5], times, 1000, start)
+    array([-0.0005, -0.0005,     nan])
+    """
+    times = np.asarray(times, dtype='datetime64[s]')
+    positions = np.asarray(positions, dtype=np.float64)
+    if isinstance(start, (np.datetime64, np.ndarray)) and np.asarray(start).dtype.kind == 'M':
+        # Whole nanoseconds between start and each time, before converting to seconds
+        delta = (np.asarray(start, dtype='datetime64[ns]') - times).astype(np.int64) / 1e9
+    else:
+        delta = start - times.astype(np.int64).astype(np.float64)
+    offsets = delta + positions / sample_rate
+
+    duration = float(timecode.frame_duration)
+    if duration < 1:
+        frame = np.clip(np.rint(offsets / duration), 0, round(1 / duration) - 1)
+        offsets = offsets - frame * duration
+    return np.where(np.isnat(times), np.nan, offsets)
@@ -0,0 +1,224 @@
+"""Real-time IRIG signal source for DACs and sound cards.
+
+A RealtimeSource keeps two frame buffers: the frame being played and the
+next frame, which is rendered ahead of time. Frame starts are aligned to the
+wall clock, and the difference between the sample clock of the output and the
+wall clock is corrected by slipping (skipping) or stuffing (repeating) samples.
+"""
+import asyncio
+import math
+import threading
+import time
+from datetime import timedelta
+from fractions import Fraction
+
+import numpy as np
+
+from irig.formats import IRIG_B
+from irig.render import symbols
+from irig.utilities import irigtime
+
+EPOCH = irigtime(1970, 1, 1)
+
+
+class RealtimeSource(object):
+    """A paced source of IRIG signal blocks.
+
+    For a callback based audio API call fill(out) from the callback, it writes
+    into the caller's buffer without allocating. Call prepare() from another
+    thread to render the next frame ahead of time. Otherwise iterate with
+    `async for block in RealtimeSource(...)`, which waits until each block is
+    due and renders the next frame in an executor while the current one plays.
+
+    Parameters
+      block_size     : samples per block returned by async iteration
+      kind           : 'analog' or 'digital'
+      dtype          : sample type
+      timecode       : formats.TimecodeFormat
+      clock          : wall clock, seconds since the epoch (UTC)
+      latency        : seconds from handing a block to the output until its first sample plays
+      tolerance      : clock error, in seconds, that is corrected
+      max_correction : most samples slipped or stuffed per block
+      buffers        : arrays that async iteration fills in turn, two of block_size by default
+
+    Counters
+      underruns      : next frame not rendered in time, or block handed over after it was due
+      slipped        : samples skipped because the output was behind the wall clock
+      stuffed        : samples repeated because the output was ahead of the wall clock
+      late_edges     : frame starts played more than tolerance away from their second edge
+      edge_error     : seconds from the last frame's edge to when its first sample played
+      max_edge_error : largest edge_error magnitude so far
+
+    >>> source = RealtimeSource(kind='digital', clock=lambda: 1469000000.75)
+    >>> block = np.empty(500, dtype='int16')
+    >>> _ = source.fill(block)
+    >>> source.frame_time, source.edge_error, source.slipped
+    (irigtime(2016, 7, 20, 7, 33, 21), 0.0, 0)
+
+    The counters, with a clock that is moved by hand. The next frame is not
+    prepared, so crossing a frame edge is an underrun:
+
+    >>> now = [1469000000.75]
+    >>> source = RealtimeSource(kind='digital', clock=lambda: now[0])
+    >>> block = np.empty(200, dtype='int16')
+    >>> _ = source.fill(block)
+    >>> now[0] += 0.2
+    >>> _ = source.fill(block)
+    >>> source.underruns, source.frame_time
+    (1, irigtime(2016, 7, 20, 7, 33, 21))
+    >>> now[0] += 0.205  # the output fell 5 ms behind the wall clock
+    >>> _ = source.fill(block)
+    >>> now[0] += 0.19   # and then ran 10 ms ahead of it
+    >>> _ = source.fill(block)
+    >>> source.slipped, source.stuffed
+    (1, 1)
+
+    A start within half a sample of a frame edge plays the next frame:
+
+    >>> source = RealtimeSource(kind='digital', clock=lambda: 1469000000.9996)
+    >>> _ = source.fill(block)
+    >>> source.frame_time, round(source.edge_error, 4)
+    (irigtime(2016, 7, 20, 7, 33, 21), -0.0004)
+    """
+    def __init__(self, block_size=1024, kind='analog', dtype=None, timecode=IRIG_B,
+                 clock=time.time, latency=0.0, tolerance=0.002, max_correction=1, buffers=None):
+        self.kind = kind
+        self.dtype = timecode.dtype(kind, dtype)
+        self.timecode = timecode
+        self.rate = timecode.sample_rate(kind)
+        self.clock = clock
+        self.latency = latency
+        self.tolerance = tolerance
+        self.max_correction = max_correction
+        if buffers is None:
+            buffers = [np.empty(block_size, dtype=self.dtype) for i in range(2)]
+        self.buffers = buffers
+
+        self.underruns = 0
+        self.slipped = 0
+        self.stuffed = 0
+        self.late_edges = 0
+        self.edge_error = None
+        self.max_edge_error = 0.0
+
+        frame_length = timecode.frame_length(kind)
+        self._frames = [np.empty(frame_length, dtype=self.dtype) for i in range(2)]
+        self._number = None      # Frames from the Unix epoch to the current frame
+        self._epoch = None       # Wall clock time of the start of the current frame, from _number
+        self._position = 0       # Sample of the current frame to play next
+        self._ready = False      # True once the next frame is rendered
+        self._lock = threading.Lock()
+        self._buffer = 0         # Index of the buffer async iteration fills next
+        self._pending = None     # Future of the next frame being rendered in an executor
+
+    @property
+    def frame_time(self):
+        """The irigtime of the frame being played"""
+        return self._time(self._epoch)
+
+    def _time(self, epoch):
+        return EPOCH + timedelta(seconds=epoch)
+
+    def _render(self, out, epoch):
+        bits = self._time(epoch).bits[:self.timecode.num_bits]
+        self.timecode.render(symbols(bits), self.kind, self.dtype, out=out)
+
+    def _start(self, now):
+        """Start playing at the current point of the frame that contains now"""
+        playing = now + self.latency
+        self._set_frame(math.floor(Fraction(playing) / self.timecode.frame_duration))
+        self._position = int(round((playing - self._epoch) * self.rate))
+        if self._position >= len(self._frames[0]):  # rounded up to the next frame edge
+            self._set_frame(self._number + 1)
+            self._position -= len(self._frames[0])
+        self._render(self._frames[0], self._epoch)
+
+    def _set_frame(self, number):
+        """Make frame number (from the Unix epoch) the current frame, with an
+        exact epoch rather than a sum of float frame durations that drifts"""
+        self._number = number
+        self._epoch = float(number * self.timecode.frame_duration)
+
+    def prepare(self):
+        """Render the next frame, if it is not rendered already"""
+        with self._lock:
+            if not self._ready and self._epoch is not None:
+                self._render(self._frames[1], float((self._number + 1) * self.timecode.frame_duration))
+                self._ready = True
+
+    def _advance(self, samples):
+        """Move the play position forward, on to the next frames as needed"""
+        self._position += samples
+        while self._position >= len(self._frames[0]):
+            if not self._ready:
+                self.underruns += 1
+                self.prepare()
+            with self._lock:
+                self._frames.reverse()
+                self._ready = False
+                self._position -= len(self._frames[0])
+                self._set_frame(self._number + 1)
+
+    def fill(self, out, now=None):
+        """Fill out with the next samples, returns out.
+
+        now is the wall clock time of the call, clock() by default. The samples
+        of out start playing latency seconds later.
+        """
+        now = self.clock() if now is None else now
+        if self._epoch is None:
+            self._start(now)
+
+        error = now + self.latency - (self._epoch + self._position / self.rate)
+        correction = 0
+        if abs(error) > self.tolerance:
+            correction = min(self.max_correction, int(round(abs(error) * self.rate)), len(out))
+        if error > 0:
+            self._advance(correction)
+            self.slipped += correction
+            filled = 0
+        else:
+            if correction:
+                out[:correction] = self._frames[0][self._position]  # _position is within the frame
+            self.stuffed += correction
+            filled = correction
+
+        while filled < len(out):
+            if self._position == 0:
+                self._edge(now + self.latency + filled / self.rate - self._epoch)
+            count = min(len(out) - filled, len(self._frames[0]) - self._position)
+            out[filled:filled + count] = self._frames[0][self._position:self._position + count]
+            filled += count
+            self._advance(count)
+        return out
+
+    def _edge(self, error):
+        self.edge_error = error
+        self.max_edge_error = max(self.max_edge_error, abs(error))
+        if abs(error) > self.tolerance:
+            self.late_edges += 1
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        loop = asyncio.get_running_loop()
+        out = self.buffers[self._buffer]
+        self._buffer = (self._buffer + 1) % len(self.buffers)
+
+        if self._epoch is not None:
+            delay = self._epoch + self._position / self.rate - self.latency - self.clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > len(out) / self.rate:
+                self.underruns += 1
+
+        self.fill(out)
+        if not self._ready and (self._pending is None or self._pending.done()):
+            self._pending = loop.run_in_executor(None, self.prepare)
+        return out
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
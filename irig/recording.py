@@ -0,0 +1,191 @@
+"""Long IRIG recordings on disk.
+
+write_signal renders a recording block by block into a WAV or raw file, so
+memory use does not depend on the duration. Recordings can be resumed or
+extended at any frame, because every frame is a fixed number of bytes from
+the start of the sample data.
+"""
+import os
+import struct
+from collections import namedtuple
+from datetime import timedelta
+from fractions import Fraction
+
+import numpy as np
+
+from irig.formats import IRIG_B
+from irig.render import encode_range
+
+BLOCK_SAMPLES = 1 << 20  # Samples rendered per block, rounded down to whole frames
+
+WAV_HEADER_SIZE = 80     # Size of the WAV header written by write_signal
+_RIFF_LIMIT = 0xFFFFFFFF
+
+# WAV format tag of each sample type
+_WAV_FORMATS = {'i2': 1, 'i4': 1, 'f4': 3, 'f8': 3}
+_PCM, _IEEE_FLOAT = 1, 3
+
+WavInfo = namedtuple('WavInfo', 'data_offset data_bytes dtype sample_rate channels')
+
+
+def wav_header(data_bytes, sample_rate, dtype, channels=1):
+    """Returns the WAV_HEADER_SIZE byte header of a WAV file.
+
+    The header always has room for an RF64 ds64 chunk (as a JUNK chunk while
+    the file is under 4 GB), so the sample data starts at the same offset
+    however long the recording grows.
+    """
+    dtype = np.dtype(dtype)
+    code = dtype.kind + str(dtype.itemsize)
+    if code not in _WAV_FORMATS:
+        raise ValueError('WAV files can not hold %s samples' % dtype)
+
+    block_align = channels * dtype.itemsize
+    fmt = struct.pack('<4sIHHIIHH', b'fmt ', 16, _WAV_FORMATS[code], channels, sample_rate,
+                      sample_rate * block_align, block_align, dtype.itemsize * 8)
+    riff_bytes = WAV_HEADER_SIZE - 8 + data_bytes
+    if riff_bytes <= _RIFF_LIMIT:
+        head = struct.pack('<4sI4s4sI28x', b'RIFF', riff_bytes, b'WAVE', b'JUNK', 28)
+        data = struct.pack('<4sI', b'data', data_bytes)
+    else:
+        head = struct.pack('<4sI4s4sIQQQI', b'RF64', _RIFF_LIMIT, b'WAVE', b'ds64', 28,
+                           riff_bytes, data_bytes, data_bytes // block_align, 0)
+        data = struct.pack('<4sI', b'data', _RIFF_LIMIT)
+    return head + fmt + data
+
+
+def _write_wav_header(f, data_bytes, sample_rate, dtype):
+    """Rewrite the header of an open WAV file, and seek to the end of its data"""
+    f.seek(0)
+    f.write(wav_header(data_bytes, sample_rate, dtype))
+    f.seek(WAV_HEADER_SIZE + data_bytes)
+
+
+def read_wav_header(f):
+    """Read the header of an open WAV (or RF64) file, returns a WavInfo"""
+    f.seek(0)
+    riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+    if riff not in (b'RIFF', b'RF64') or wave != b'WAVE':
+        raise ValueError('not a WAV file')
+
+    ds64_data_bytes = dtype = sample_rate = channels = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError('WAV file has no data chunk')
+        chunk, size = struct.unpack('<4sI', header)
+        if chunk == b'data':
+            if size == _RIFF_LIMIT and ds64_data_bytes is not None:
+                size = ds64_data_bytes
+            if dtype is None:
+                raise ValueError('WAV file has no fmt chunk')
+            return WavInfo(f.tell(), size, dtype, sample_rate, channels)
+
+        body = f.read(size + size % 2)
+        if chunk == b'ds64':
+            ds64_data_bytes = struct.unpack('<Q', body[8:16])[0]
+        elif chunk == b'fmt ':
+            tag, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+            kind = {_PCM: 'i', _IEEE_FLOAT: 'f'}.get(tag)
+            if kind is None or kind + str(bits // 8) not in _WAV_FORMATS:
+                raise ValueError('unsupported WAV sample format')
+            dtype = np.dtype('<%s%d' % (kind, bits // 8))
+
+
+def read_signal(path, kind='digital', dtype=None, sample_rate=None, channel=0, timecode=IRIG_B):
+    """Returns the samples of a recording as a read-only memmap, and their sample rate.
+
+    Files ending in .wav are read as WAV files, with their own sample type and
+    rate. Other files are raw samples of dtype at sample_rate, by default those
+    written by write_signal.
+    """
+    if path.lower().endswith('.wav'):
+        with open(path, 'rb') as f:
+            info = read_wav_header(f)
+        frames = info.data_bytes // (info.dtype.itemsize * info.channels)
+        data = np.memmap(path, info.dtype, 'r', info.data_offset, (frames, info.channels))
+        return data[:, channel], info.sample_rate
+    dtype = timecode.dtype(kind, dtype)
+    sample_rate = sample_rate or timecode.sample_rate(kind)
+    if not os.path.getsize(path):
+        return np.empty(0, dtype=dtype), sample_rate
+    return np.memmap(path, dtype, 'r'), sample_rate
+
+
+def write_signal(path, start, duration, format='wav', dtype=None, kind='analog',
+                 timecode=IRIG_B, frame_offset=None, block_samples=BLOCK_SAMPLES):
+    """Write an IRIG signal to a WAV or raw file, in bounded memory.
+
+    start is the time of the first frame of the file, and duration is the
+    number of seconds to write. Frames are rendered block_samples at a time
+    into one reused buffer and written straight to the file. A WAV header is
+    kept up to date after every block, so an interrupted file stays readable
+    and can be resumed.
+
+    To resume or extend an existing file, give the frame to write from as
+    frame_offset ('end' to append after its last complete frame). The file is
+    cut at that frame and duration seconds are written from there, so the
+    frames before it are not rendered again.
+
+    Returns the number of frames in the file.
+
+    >>> import os, tempfile
+    >>> from irig.utilities import irigtime
+    >>> path = os.path.join(tempfile.mkdtemp(), 'irig.wav')
+    >>> write_signal(path, irigtime(2016, 7, 20, 1, 49), 2, dtype='int16')
+    2
+    >>> write_signal(path, irigtime(2016, 7, 20, 1, 49), 3, dtype='int16', frame_offset='end')
+    5
+    >>> os.path.getsize(path) == WAV_HEADER_SIZE + 5 * 32000 * 2
+    True
+    """
+    if format not in ('wav', 'raw'):
+        raise ValueError("format must be 'wav' or 'raw'")
+    dtype = timecode.dtype(kind, dtype)
+    sample_rate = timecode.sample_rate(kind)
+    if format == 'wav':
+        wav_header(0, sample_rate, dtype)  # Check the sample type before touching the file
+    frame_bytes = timecode.frame_length(kind) * dtype.itemsize
+    data_offset = WAV_HEADER_SIZE if format == 'wav' else 0
+
+    frames = Fraction(duration) / timecode.frame_duration
+    if frames.denominator != 1:
+        raise ValueError('duration must be a whole number of frames')
+    frames = int(frames)
+
+    with open(path, 'wb' if frame_offset is None else 'r+b') as f:
+        if frame_offset is None:
+            frame_offset = 0
+        else:
+            if format == 'wav':
+                info = read_wav_header(f)
+                if info.data_offset != data_offset or info.dtype != dtype or \
+                        info.sample_rate != sample_rate:
+                    raise ValueError('%s does not match the signal being written' % path)
+            existing = max(0, os.fstat(f.fileno()).st_size - data_offset) // frame_bytes
+            if frame_offset == 'end':
+                frame_offset = existing
+            elif frame_offset > existing:
+                raise ValueError('%s only has %d complete frames' % (path, existing))
+
+        f.seek(data_offset + frame_offset * frame_bytes)
+        f.truncate()
+        if format == 'wav':
+            _write_wav_header(f, frame_offset * frame_bytes, sample_rate, dtype)
+
+        block_frames = max(1, block_samples // timecode.frame_length(kind))
+        buffer = np.empty((block_frames, timecode.frame_length(kind)), dtype=dtype)
+        for first in range(frame_offset, frame_offset + frames, block_frames):
+            count = min(block_frames, frame_offset + frames - first)
+            block_start = start + timedelta(seconds=float(first * timecode.frame_duration))
+            block = encode_range(block_start, count * timecode.frame_duration, kind, dtype,
+                                 timecode=timecode, out=buffer[:count])
+            f.write(block.astype(dtype.newbyteorder('<'), copy=False).data)
+            if format == 'wav':
+                _write_wav_header(f, (first + count) * frame_bytes, sample_rate, dtype)
+    return frame_offset + frames
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
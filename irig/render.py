@@ -0,0 +1,127 @@
+"""Vectorized rendering of IRIG frames into NumPy sample arrays.
+
+Instead of yielding one sample at a time, a frame is rendered by indexing
+precomputed per-symbol templates with the symbol codes of its bit string.
+"""
+from datetime import timedelta
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+
+from irig.formats import IRIG_B
+from irig.utilities import SYMBOLS, BCD_FIELDS, BINARY_FIELDS, irigtime
+
+# Maps each byte of a bit string to its symbol code, 255 for invalid bytes
+_SYMBOL_CODES = np.full(256, 255, dtype=np.uint8)
+for _code, _symbol in enumerate(SYMBOLS):
+    _SYMBOL_CODES[ord(_symbol)] = _code
+
+
+def symbols(bits):
+    """Convert a bit string into an array of symbol codes (2 is a marker)
+    >>> symbols('_01_')
+    array([2, 0, 1, 2], dtype=uint8)
+    """
+    codes = _SYMBOL_CODES[np.frombuffer(bits.encode('ascii'), dtype=np.uint8)]
+    if (codes == 255).any():
+        raise ValueError('bits must only contain the symbols ' + SYMBOLS)
+    return codes
+
+
+def render_digital(bits, dtype='int16', timecode=IRIG_B):
+    """Render a bit string into a digital (TTL) signal array"""
+    return timecode.render(symbols(bits[:timecode.num_bits]), 'digital', dtype)
+
+
+def render_analog(bits, dtype='float32', timecode=IRIG_B):
+    """Render a bit string into an analog (AM) signal array"""
+    return timecode.render(symbols(bits[:timecode.num_bits]), 'analog', dtype)
+
+
+def _field_values(t):
+    """The values of the BCD fields of the frame for time t"""
+    return (t.second, t.minute, t.hour, t.timetuple().tm_yday, t.year % 100)
+
+
+@lru_cache(maxsize=None)
+def _field_codes(name, value):
+    """Returns the positions and symbol codes of a BCD field holding value
+    >>> _field_codes('second', 49)
+    (array([1, 2, 3, 4, 6, 7, 8]), array([1, 0, 0, 1, 1, 0, 0], dtype=uint8))
+    """
+    positions, codes = [], []
+    for index, width in BCD_FIELDS[name]:
+        value, digit = divmod(value, 10)
+        positions.extend(range(index, index + width))
+        codes.extend((digit >> bit) & 1 for bit in reversed(range(width)))
+    return np.array(positions), np.array(codes, dtype=np.uint8)
+
+
+def _binary_positions(name):
+    """The frame positions of the bits of a straight binary field, least significant first"""
+    return np.concatenate([np.arange(index, index + width) for index, width in BINARY_FIELDS[name]])
+
+
+def encode_range(start, seconds, kind='digital', dtype=None, flat=False, timecode=IRIG_B, out=None,
+                 control=0):
+    """Render the signal of consecutive frames covering `seconds` seconds,
+    starting at start. Returns a (frames, samples) array, or a flat buffer if
+    flat is True. The frames are rendered into out if it is given. control is
+    the control functions payload of every frame.
+
+    Only the symbols of the fields that changed since the previous frame are
+    rendered again (seconds and SBS every frame, minutes every 60 frames, and so on).
+
+    >>> frames = encode_range(irigtime(2016, 12, 31, 23, 59, 58), 3)
+    >>> frames.shape
+    (3, 1000)
+    >>> np.array_equal(frames[2], irigtime(2017, 1, 1).digital_array())
+    True
+    """
+    count = Fraction(seconds) / timecode.frame_duration
+    if count.denominator != 1:
+        raise ValueError('seconds must be a whole number of frames')
+    count = int(count)
+
+    dtype = timecode.dtype(kind, dtype)
+    shape = (count, timecode.frame_length(kind))
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    elif out.dtype != dtype or out.size != shape[0] * shape[1]:
+        raise ValueError('out must hold %d x %d %s samples' % (shape + (dtype,)))
+    out = out.reshape(shape)
+
+    # SBS bits that fit in the frame, 60 bit frames have none
+    sbs_positions = _binary_positions('sbs')
+    sbs_weights = np.arange(len(sbs_positions))[sbs_positions < timecode.num_bits]
+    sbs_positions = sbs_positions[sbs_weights]
+
+    if count:
+        values = _field_values(start)
+        codes = symbols(irigtime.generate_bit_str(*values[:4], start.year, control)[:timecode.num_bits])
+        timecode.render(codes, kind, dtype, out=out[0])
+
+    for i in range(1, count):
+        out[i] = out[i-1]
+        new_values = _field_values(start + timedelta(seconds=float(i * timecode.frame_duration)))
+        if new_values[0] != values[0] and len(sbs_positions):
+            second, minute, hour = new_values[:3]
+            sbs_codes = (((second + 60 * minute + 3600 * hour) >> sbs_weights) & 1).astype(np.uint8)
+            changed = codes[sbs_positions] != sbs_codes
+            codes[sbs_positions[changed]] = sbs_codes[changed]
+            timecode.render(sbs_codes[changed], kind, dtype, out=out[i], positions=sbs_positions[changed])
+        for name, value, old_value in zip(BCD_FIELDS, new_values, values):
+            if value != old_value:
+                positions, field_codes = _field_codes(name, value)
+                changed = codes[positions] != field_codes
+                positions, field_codes = positions[changed], field_codes[changed]
+                codes[positions] = field_codes
+                timecode.render(field_codes, kind, dtype, out=out[i], positions=positions)
+        values = new_values
+
+    return out.reshape(-1) if flat else out
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from datetime import datetime
 from functools import partial
 import math
@@ -14,11 +15,60 @@ SAMPLE_FREQ = 32000   # Somewhat arbitrarily chosen. This produces 32 samples/wa
 SAMPLES = SAMPLE_FREQ//CARRIER_FREQ
 
 NUM_FRAME_BITS = 100  # Based on IRIG spec
+SYMBOLS = '01_'       # Symbol codes, a marker is 2 as in hardware.FrameShiftRegister
+
+# Position of each BCD field in a frame, as (index, width) of each digit, least
+# significant digit first. Digits are written most significant bit first.
+BCD_FIELDS = {
+    'second': ((1, 4), (6, 3)),
+    'minute': ((10, 4), (15, 3)),
+    'hour': ((20, 4), (25, 2)),
+    'day_of_year': ((30, 4), (35, 4), (40, 2)),
+    'year': ((50, 4), (55, 4)),
+}
+
+# Position of each straight binary field, as (index, width) of each part, least
+# significant part first. Unlike the BCD fields, bits are written least
+# significant bit first, as in the IRIG spec. 'control' holds the 18 bit
+# control functions and 'sbs' the straight binary seconds of the day.
+BINARY_FIELDS = {
+    'control': ((60, 9), (70, 9)),
+    'sbs': ((80, 9), (90, 8)),
+}
+
+# Value of each valid BCD digit, keyed by its bits
+_BCD_DIGITS = {format(digit, '0%db' % width): digit
+               for width in (2, 3, 4) for digit in range(min(10, 2**width))}
+
+# Day of year (from 0) that each month starts on, and the days in the year,
+# for common and leap years. Years are 2000-2099, so every 4th year is a leap year.
+_MONTH_STARTS = {
+    leap: [sum([31, 28 + leap, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][:month]) for month in range(13)]
+    for leap in (False, True)
+}
 
 f = lambda x, a, c=CARRIER_FREQ, s=SAMPLE_FREQ, o=OFFSET: a*math.sin(x*c/s*2*math.pi)+o
 LARGE_WAVE = [f(x, AM_LARGE_AMP) for x in range(SAMPLES)]
 SMALL_WAVE = [f(x, AM_SMALL_AMP) for x in range(SAMPLES)]
 
+def _timecode(timecode):
+    """The formats.TimecodeFormat to use, IRIG-B if timecode is None"""
+    if timecode is None:
+        from irig.formats import IRIG_B
+        return IRIG_B
+    return timecode
+
+def _binary_bits(value, parts):
+    """The bit strings of the parts of a straight binary field holding value
+    >>> _binary_bits(6540, BINARY_FIELDS['sbs'])
+    ['001100011', '00110000']
+    """
+    strings = []
+    for index, width in parts:
+        strings.append(format(value & ((1 << width) - 1), '0%db' % width)[::-1])
+        value >>= width
+    return strings
+
 def random_bit():
     """Returns a random IRIG bit
     >>> random.seed(1)
@@ -72,38 +122,83 @@ class irigtime(datetime):
     def bits(self):
         """Return the bits of this IRIG frame
         >>> irigtime(2016, 7, 20, 1, 49).bits
-        '_00000000_100101000_000100000_001000000_100000000_011000001_000000000_000000000_000000000_000000000_'
+        '_00000000_100101000_000100000_001000000_100000000_011000001_000000000_000000000_001100011_001100000_'
         """
         return self.generate_bit_str(self.second, self.minute, self.hour, self.timetuple().tm_yday, self.year)
 
+    @property
+    def frame(self):
+        """Return this IRIG frame packed into an IrigFrame
+        >>> irigtime(2016, 7, 20, 1, 49).frame
+        IrigFrame(0x318c0000041801010080a400)
+        """
+        from irig.frame import IrigFrame
+        return IrigFrame.from_irigtime(self)
+
+    @property
+    def sbs(self):
+        """Return the straight binary seconds (seconds of the day) of this frame"""
+        return self.second + 60*self.minute + 3600*self.hour
+
     @property
     def digital_signal(self):
         """Returns a generator for the IRIG digital signal"""
-        for bit in self.bits:
-            for i in range(PULSE_WIDTH):
-                yield TTL_AMP if i < BIT_WIDTH[bit] else 0
+        yield from self.digital_array().tolist()
 
     @property
     def analog_signal(self):
         """Returns a generator for an IRIG analog signal"""
-        for bit in self.digital_signal:
-            wave = LARGE_WAVE if bit else SMALL_WAVE
-            for x in wave:
-                yield x
+        yield from self.analog_array('float64').tolist()
+
+    def digital_array(self, dtype='int16', timecode=None):
+        """Returns the IRIG digital signal as a NumPy array, in the
+        formats.TimecodeFormat timecode (IRIG-B by default)
+        >>> irigtime(2016, 7, 20, 1, 49).digital_array()[:20]
+        array([5, 5, 5, 5, 5, 5, 5, 5, 0, 0, 5, 5, 0, 0, 0, 0, 0, 0, 0, 0],
+              dtype=int16)
+        """
+        from irig import render
+        return render.render_digital(self.bits, dtype, _timecode(timecode))
+
+    def analog_array(self, dtype='float32', timecode=None):
+        """Returns the IRIG analog signal as a NumPy array. Integer dtypes
+        are scaled so that AM_LARGE_AMP is full scale.
+        >>> irigtime(2016, 7, 20, 1, 49).analog_array('int16')[:4]
+        array([    0,  6393, 12539, 18204], dtype=int16)
+        """
+        from irig import render
+        return render.render_analog(self.bits, dtype, _timecode(timecode))
 
     @staticmethod
-    def from_digital_signal(signal):
-        """Creates an irigtime from an irig digital signal"""
-        if (len(signal) != PULSE_WIDTH * NUM_FRAME_BITS):
+    def from_digital_signal(signal, timecode=None):
+        """Creates an irigtime from an irig digital signal
+        >>> irigtime.from_digital_signal(list(irigtime(2016, 7, 20, 1, 49).digital_signal))
+        irigtime(2016, 7, 20, 1, 49)
+        """
+        frame_length = PULSE_WIDTH * NUM_FRAME_BITS
+        if timecode is not None:
+            frame_length = timecode.pulse_width * timecode.num_bits
+        if (len(signal) != frame_length):
             raise ValueError('signal must be a complete irig frame')
 
-        bits = irigtime.demodulate_digital_signal(signal)
+        bits = irigtime.demodulate_digital_signal(signal, timecode)
 
         return irigtime.from_bits(bits)
 
     @staticmethod
-    def from_analog_signal(signal):
-      pass  #TODO
+    def from_analog_signal(signal, timecode=None):
+        """Creates an irigtime from an irig analog signal
+        >>> from irig.formats import IRIG_A
+        >>> signal = irigtime(2016, 7, 20, 1, 49).analog_array(timecode=IRIG_A.with_sample_freq(44100))
+        >>> irigtime.from_analog_signal(signal, IRIG_A.with_sample_freq(44100))
+        irigtime(2016, 7, 20, 1, 49)
+        """
+        if (len(signal) != _timecode(timecode).frame_samples):
+            raise ValueError('signal must be a complete irig frame')
+
+        bits = irigtime.demodulate_analog_signal(signal, timecode)
+
+        return irigtime.from_bits(bits)
 
     @staticmethod
     def from_bits(bits):
@@ -112,45 +207,95 @@ class irigtime(datetime):
         >>> irigtime.from_bits(bits)
         irigtime(2016, 8, 26, 2, 11, 11)
         """
-        second = str(int(bits[6:9], 2)) + str(int(bits[1:5], 2))
-        minute = str(int(bits[15:18], 2)) + str(int(bits[10:14], 2))
-        hour = str(int(bits[25:27], 2)) + str(int(bits[20:24], 2))
-        day_of_year = str(int(bits[40:42], 2)) + str(int(bits[35:39], 2)) + str(int(bits[30:34], 2))
-        year = '20' + str(int(bits[55:59], 2)) + str(int(bits[50:54], 2))
+        return irigtime.from_fields(*irigtime.fields_from_bits(bits))
 
-        # return irigtime(second, minute, hour, day_of_year, year)
-        return irigtime.strptime(' '.join([year, day_of_year, hour, minute, second]), '%Y %j %H %M %S')
+    @staticmethod
+    def fields_from_bits(bits):
+        """Read the BCD fields of a bit string, in from_fields order
+        >>> irigtime.fields_from_bits(irigtime(2016, 8, 26, 2, 11, 11).bits)
+        [11, 11, 2, 239, 16]
+        """
+        values = []
+        for digits in BCD_FIELDS.values():
+            value = 0
+            for index, width in reversed(digits):
+                digit = _BCD_DIGITS.get(bits[index:index + width])
+                if digit is None:
+                    raise ValueError('invalid BCD digit %r at bit %d' % (bits[index:index + width], index))
+                value = value * 10 + digit
+            values.append(value)
+        return values
+
+    @staticmethod
+    def sbs_from_bits(bits):
+        """Read the straight binary seconds from a bit string, without decoding the BCD fields
+        >>> irigtime.sbs_from_bits(irigtime(2016, 7, 20, 1, 49).bits)
+        6540
+        """
+        value = 0
+        for index, width in reversed(BINARY_FIELDS['sbs']):
+            value = (value << width) | int(bits[index:index + width][::-1], 2)
+        return value
 
     @staticmethod
-    def demodulate_digital_signal(signal):
-        bstr = ''
+    def from_fields(second, minute, hour, day_of_year, year):
+        """Create an irigtime from IRIG fields, the year counts from 2000
+        >>> irigtime.from_fields(11, 11, 2, 239, 16)
+        irigtime(2016, 8, 26, 2, 11, 11)
+        """
+        year += 2000
+        month_starts = _MONTH_STARTS[year % 4 == 0]
+        if not 1 <= day_of_year <= month_starts[-1]:
+            raise ValueError('day of year %d is out of range for %d' % (day_of_year, year))
+        month = bisect_right(month_starts, day_of_year - 1)
+        day = day_of_year - month_starts[month - 1]
+
+        return irigtime(year, month, day, hour, minute, second)
+
+    @staticmethod
+    def from_bits_many(symbols):
+        """Decode an N x 100 array of symbol codes, see decode.from_bits_many"""
+        from irig import decode
+        return decode.from_bits_many(symbols)
+
+    @staticmethod
+    def demodulate_digital_signal(signal, timecode=None):
+        bit_width = BIT_WIDTH if timecode is None else timecode.bit_width
+        symbols = []
         pulse_count = 0
         for x in signal:
             if x:
                 pulse_count += 1
-            elif pulse_count >= irigtime.BIT_WIDTH['_']:
+            elif pulse_count >= bit_width['_']:
                 pulse_count = 0
-                bstr += '_'
-            elif pulse_count >= irigtime.BIT_WIDTH['1']:
+                symbols.append('_')
+            elif pulse_count >= bit_width['1']:
                 pulse_count = 0
-                bstr += '1'
-            elif pulse_count >= irigtime.BIT_WIDTH['0']:
+                symbols.append('1')
+            elif pulse_count >= bit_width['0']:
                 pulse_count = 0
-                bstr += '0'
+                symbols.append('0')
             else:
                 pulse_count = 0
 
-        return bstr
-                
+        return ''.join(symbols)
 
     @staticmethod
-    def generate_bit_str(second, minute, hour, day_of_year, year):
+    def demodulate_analog_signal(signal, timecode=None):
+        """Returns the bits of an analog signal that starts on a carrier cycle"""
+        from irig import decode
+        return decode.demodulate_analog(signal, _timecode(timecode))
+
+    @staticmethod
+    def generate_bit_str(second, minute, hour, day_of_year, year, control=0):
         """Generate bit string from IRIG fields
         Years field is only two digits, eg 00-99, so we define it as
-        years since 2000.
+        years since 2000. control is the 18 bit control functions payload.
         """
         if year < 2000:
           raise ValueError('year must be >= 2000')
+        if not 0 <= control < 1 << 18:
+          raise ValueError('control must be an 18 bit value')
 
         # P0
         bitstring = '_'
@@ -211,25 +356,26 @@ class irigtime(datetime):
         bitstring += '_'
 
         # Control functions
-        bitstring += '0'*9  # (TODO)
+        control_low, control_high = _binary_bits(control, BINARY_FIELDS['control'])
+        bitstring += control_low
 
         # P7
         bitstring += '_'
 
         # Control functions (continued)
-        bitstring += '0'*9  # (TODO)
+        bitstring += control_high
 
         # P8
         bitstring += '_'
 
         # Straight Binary Seconds
-        bitstring += '0'*9  # (TODO)
+        sbs_low, sbs_high = _binary_bits(second + 60*minute + 3600*hour, BINARY_FIELDS['sbs'])
+        bitstring += sbs_low
 
-        # P8
         bitstring += '_'
 
         # Straight Binary Seconds (continued)
-        bitstring += '0'*8   # (TODO)
+        bitstring += sbs_high
         bitstring += '0'
 
         # P9
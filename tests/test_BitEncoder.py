@@ -4,15 +4,16 @@ import random
 
 PERIOD = 1000
 
-def bench():
-  rst = ResetSignal(0, active=1, async=True)
+def bench(pulse_length=10, prescale=1, num_bits=100):
+  rst = ResetSignal(0, active=1, isasync=True)
   request, ttl, enable, clk = [Signal(bool(0)) for i in range(4)]
   bit = Signal(intbv(0)[2:])
-  pulse_length = Signal(intbv(0)[8:])
 
-  dut = hardware.BitEncoder(bit, request, ttl, enable, clk, rst)
+  dut = hardware.BitEncoder(bit, request, ttl, enable, clk, rst, pulse_length, prescale)
 
-  pulse_counter = Signal(intbv(0)[8:])
+  # Clock cycles the pulse of each symbol is high
+  widths = [pulse_length * tenths // 10 * prescale for tenths in (2, 5, 8)]
+  pulse_counter = Signal(intbv(0, min=0, max=pulse_length * prescale + 1))
 
   @always(delay(PERIOD//2))
   def clkgen():
@@ -28,12 +29,7 @@ def bench():
     while True:
       yield request.posedge  # bit was sent
       assert bit in [0, 1, 2]
-      if bit == 0:
-        assert pulse_counter == int(pulse_length * 0.2)
-      elif bit == 1:
-        assert pulse_counter == int(pulse_length * 0.5)
-      elif bit == 2:
-        assert pulse_counter == int(pulse_length * 0.8)
+      assert pulse_counter == widths[bit]
 
   @instance
   def stimulus():
@@ -41,11 +37,10 @@ def bench():
     enable.next = bool(0)
     yield clk.negedge 
     rst.next = bool(0)
-    pulse_length.next = 10
     yield clk.negedge 
     enable.next = bool(1)
 
-    for i in range(100):
+    for i in range(num_bits):
       bit.next = random.choice([0, 1, 2])
       yield request.posedge
 
@@ -58,5 +53,21 @@ def test_bench():
   sim = Simulation(sim)
   sim.run()
 
+def test_pulse_lengths():
+  # Widths that are not whole counts are rounded down
+  for pulse_length in [7, 12, 15, 256]:
+    sim = Simulation(bench(pulse_length, num_bits=20))
+    sim.run(quiet=1)
+
+def test_100MHz():
+  # IRIG-B from a 100 MHz clock, with a long counter
+  sim = Simulation(bench(pulse_length=100000, num_bits=3))
+  sim.run(quiet=1)
+
+def test_prescale():
+  # IRIG-B from a 100 MHz clock, through the prescaler (scaled down to keep the test short)
+  sim = Simulation(bench(pulse_length=10, prescale=1000, num_bits=20))
+  sim.run(quiet=1)
+
 if __name__ == '__main__':
   test_bench()
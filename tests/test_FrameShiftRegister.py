@@ -5,7 +5,7 @@ import random
 PERIOD = 1000
 
 def bench():
-  rst = ResetSignal(0, active=1, async=True)
+  rst = ResetSignal(0, active=1, isasync=True)
   request = Signal(bool(0))
   frame_latched, enable, clk = [Signal(bool(0)) for i in range(3)]
   irig_bit = Signal(intbv(0)[2:])
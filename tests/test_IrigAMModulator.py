@@ -0,0 +1,57 @@
+from myhdl import *
+from irig import hardware
+from irig.frame import IrigFrame
+from irig.utilities import irigtime, SAMPLES
+
+PERIOD = 1000
+
+def bench(t, dac_bits=16, dtype='int16'):
+  """ IrigTTLEncoder drives IrigAMModulator from the same clock, and a frame
+  of DAC samples is compared to irigtime.analog_array """
+  rst = ResetSignal(0, active=1, isasync=True)
+  frame_latched, ttl, enable, clk = [Signal(bool(0)) for i in range(4)]
+  next_frame = Signal(intbv(IrigFrame.from_irigtime(t).to_intbv())[100:])
+  dac_out = Signal(intbv(0, min=-2**(dac_bits-1), max=2**(dac_bits-1)))
+
+  encoder = hardware.IrigTTLEncoder(next_frame, frame_latched, ttl, enable, clk, rst, prescale=SAMPLES)
+  modulator = hardware.IrigAMModulator(ttl, dac_out, enable, clk, rst, dac_bits=dac_bits)
+
+  expected = t.analog_array(dtype).tolist()
+  samples = []
+
+  @always(delay(PERIOD//2))
+  def clkgen():
+    clk.next = not clk
+
+  @instance
+  def monitor():
+    # The frame starts within the first couple of bits, after the first marker
+    while len(samples) < len(expected) + 2 * len(expected) // 100:
+      yield clk.negedge
+      if enable:
+        samples.append(int(dac_out))
+
+    offsets = [i for i in range(len(samples) - len(expected) + 1) if samples[i:i+len(expected)] == expected]
+    assert offsets, 'no frame of samples matches analog_array'
+    raise StopSimulation
+
+  @instance
+  def stimulus():
+    rst.next = bool(1)
+    yield clk.negedge
+    rst.next = bool(0)
+    yield clk.negedge
+    enable.next = bool(1)
+
+  return encoder, modulator, clkgen, monitor, stimulus
+
+def test_16bits():
+  sim = Simulation(bench(irigtime(2016, 7, 20, 1, 49, 37)))
+  sim.run(quiet=1)
+
+def test_8bits():
+  sim = Simulation(bench(irigtime(2017, 12, 31, 23, 59, 59), dac_bits=8, dtype='int8'))
+  sim.run(quiet=1)
+
+if __name__ == '__main__':
+  test_16bits()
@@ -0,0 +1,71 @@
+from myhdl import *
+from irig import hardware, utilities
+from irig.frame import marker_mask
+
+PERIOD = 1000
+
+def bench(num_bits, num_frames=5):
+  """ Loops random frames through IrigTTLEncoder into IrigTTLDecoder """
+  rst = ResetSignal(0, active=1, isasync=True)
+  frame_latched, ttl, frame_valid, enable, clk = [Signal(bool(0)) for i in range(5)]
+  next_frame = Signal(intbv(0)[num_bits:])
+  frame_out = Signal(intbv(0)[num_bits:])
+
+  encoder = hardware.IrigTTLEncoder(next_frame, frame_latched, ttl, enable, clk, rst, num_bits=num_bits)
+  decoder = hardware.IrigTTLDecoder(ttl, frame_out, frame_valid, enable, clk, rst, num_bits=num_bits)
+
+  sent = []
+  data = (1 << num_bits) - 1 - marker_mask(num_bits)  # non-marker bits
+
+  @always(delay(PERIOD//2))
+  def clkgen():
+    clk.next = not clk
+
+  @always(clk.negedge)
+  def get_frame():
+    if frame_latched:
+      sent.append(int(next_frame) & data)
+
+  @instance
+  def monitor():
+    received = 0
+    while True:
+      yield clk.negedge
+      if frame_valid:
+        assert int(frame_out) == sent[received]
+        received += 1
+        if received == num_frames:
+          raise StopSimulation
+
+  @instance
+  def stimulus():
+    rst.next = bool(1)
+    enable.next = bool(0)
+    yield clk.negedge
+    rst.next = bool(0)
+
+    frame = utilities.random_frame(num_bits).replace('_','0')
+    next_frame.next = int(frame, 2)
+
+    yield clk.negedge
+    enable.next = bool(1)
+
+    while True:
+      yield frame_latched.negedge  # wait til frame is latched before changing it
+      frame = utilities.random_frame(num_bits).replace('_','0')
+      next_frame.next = int(frame, 2)
+
+  return encoder, decoder, clkgen, get_frame, monitor, stimulus
+
+def test_loopback_100bits():
+  sim = Simulation(bench(num_bits=100))
+  sim.run(quiet=1)
+
+def test_loopback_60bits():
+  sim = Simulation(bench(num_bits=60))
+  sim.run(quiet=1)
+
+if __name__ == '__main__':
+  sim = traceSignals(bench, num_bits=100)
+  sim = Simulation(sim)
+  sim.run()
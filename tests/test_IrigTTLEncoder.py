@@ -1,87 +1,85 @@
 from myhdl import *
-from irig import hardware, utilities
+from irig import hardware, model, utilities
+import numpy as np
 import random
 
 PERIOD = 1000
 
-def bench(num_bits):
-  rst = ResetSignal(0, active=1, async=True)
+def bench(num_bits, num_frames=10, pulse_length=10, prescale=1):
+  """ Encodes random frames, and compares the cycles that ttl_out and
+  frame_latched change at with model.encoder_model """
+  rst = ResetSignal(0, active=1, isasync=True)
   frame_latched, ttl_out, enable, clk = [Signal(bool(0)) for i in range(4)]
   next_frame = Signal(intbv(0)[num_bits:])
 
-  dut = hardware.IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bits=num_bits)
-  frame = Signal(intbv(0)[num_bits:])
+  dut = hardware.IrigTTLEncoder(next_frame, frame_latched, ttl_out, enable, clk, rst, num_bits=num_bits,
+                                pulse_length=pulse_length, prescale=prescale)
+
+  frames = [int(utilities.random_frame(num_bits).replace('_','0'), 2) for i in range(num_frames)]
+  ttl, latched = model.encoder_model(frames, num_bits, pulse_length, prescale)
+  start = []  # time of cycle 0
+  edges = {'ttl_out': ([], []), 'frame_latched': ([], [])}
 
   @always(delay(PERIOD//2))
   def clkgen():
     clk.next = not clk
 
-  @always(clk.negedge)
-  def get_frame():
-    if frame_latched:
-      frame.next = next_frame
-
-  @instance
-  def pulse_counter():
-    while True:
-      yield ttl_out.posedge
-      pulse_count = 0 
-
-      yield clk.negedge
-      while ttl_out:
-        pulse_count += 1
-        yield clk.negedge
-
-  @instance
-  def monitor():
-    while True:
-      yield clk.negedge
-
-      if enable and not rst:
-        if frame_latched:
-          index = 0
-        elif request:
-          index += 1
-
-        if index == 0 or index % 10 == 9:
-          assert irig_bit == 2
-        else:
-          assert irig_bit == frame[index]
+  def record(signal, rising, falling):
+    @instance
+    def recorder():
+      while True:
+        yield signal
+        if start:
+          (rising if signal else falling).append((now() - start[0]) // PERIOD)
+    return recorder
 
   @instance
   def stimulus():
     rst.next = bool(1)
     enable.next = bool(0)
-    yield clk.negedge 
+    yield clk.negedge
     rst.next = bool(0)
 
-    frame = utilities.random_frame(num_bits).replace('_','0')
-    next_frame.next = int(frame, 2)
+    next_frame.next = frames[0]
 
-    yield clk.negedge 
+    yield clk.negedge
     enable.next = bool(1)
+    yield clk.posedge
+    start.append(now())
 
-    num_frames = 10
-    for i in range(num_frames): 
+    for frame in frames[1:]:
       yield frame_latched.negedge  # wait til frame is latched before changing it
-      frame = utilities.random_frame(num_bits).replace('_','0')
-      next_frame.next = int(frame, 2)
+      next_frame.next = frame
 
+    yield delay(start[0] + len(ttl) * PERIOD - PERIOD//2 - now())  # through the last cycle
+    for name, expected in (('ttl_out', ttl), ('frame_latched', latched)):
+      rising, falling = model.transitions(expected)
+      assert edges[name][0] == rising.tolist(), name
+      assert edges[name][1] == falling.tolist(), name
     raise StopSimulation
 
-  return dut, clkgen, get_frame, pulse_counter, stimulus
+  return dut, clkgen, record(ttl_out, *edges['ttl_out']), record(frame_latched, *edges['frame_latched']), stimulus
+
+def run(*args, **kwargs):
+  sim = Simulation(bench(*args, **kwargs))
+  sim.run(quiet=1)
 
 def test_bench_100bits():
-  # sim = traceSignals(bench, num_bits=100)
-  # sim = Simulation(sim)
-  sim = Simulation(bench, num_bits=100)
-  sim.run()
+  run(num_bits=100)
 
 def test_bench_60bits():
-  # sim = traceSignals(bench, num_bits=60)
-  # sim = Simulation(sim)
-  sim = Simulation(bench, num_bits=60)
-  sim.run()
+  run(num_bits=60)
+
+def test_prescale():
+  run(num_bits=100, num_frames=3, prescale=3)
+
+def test_pulse_length():
+  run(num_bits=60, num_frames=3, pulse_length=16)
+
+def test_many_frames():
+  # The shortest pulses that keep the symbols apart, to get through more frames
+  random.seed(2)
+  run(num_bits=100, num_frames=3000, pulse_length=5)
 
 if __name__ == '__main__':
   # Visual test for IRIG-H
@@ -89,4 +87,3 @@ if __name__ == '__main__':
   sim = traceSignals(bench, num_bits=60)
   sim = Simulation(sim)
   sim.run()
-
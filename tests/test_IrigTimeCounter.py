@@ -0,0 +1,139 @@
+from myhdl import *
+from irig import hardware
+from irig.frame import IrigFrame
+from irig.utilities import irigtime
+from datetime import timedelta
+import random
+
+PERIOD = 1000
+
+def bench(start, num_frames, num_bits=100, seconds_per_frame=1, frames_per_second=1, pps_sync=False):
+  """ Loads start, then pulses frame_latched (or pps) and checks next_frame
+  against IrigFrame.from_irigtime after every pulse """
+  rst = ResetSignal(0, active=1, isasync=True)
+  frame_latched, load, pps, clk = [Signal(bool(0)) for i in range(4)]
+  next_frame, load_frame = [Signal(intbv(0)[num_bits:]) for i in range(2)]
+  control = Signal(intbv(0x2A5A5)[18:])
+
+  dut = hardware.IrigTimeCounter(next_frame, frame_latched, load, load_frame, control, pps, clk, rst,
+                                 num_bits=num_bits, seconds_per_frame=seconds_per_frame,
+                                 frames_per_second=frames_per_second, pps_sync=pps_sync)
+
+  def expected(frame):
+    if pps_sync:
+      t = start + timedelta(seconds=frame)
+    else:
+      t = start + timedelta(seconds=frame // frames_per_second * seconds_per_frame)
+    return int(IrigFrame.from_irigtime(t, int(control))) & ((1 << num_bits) - 1)
+
+  @always(delay(PERIOD//2))
+  def clkgen():
+    clk.next = not clk
+
+  @instance
+  def stimulus():
+    rst.next = bool(1)
+    yield clk.negedge
+    rst.next = bool(0)
+
+    load_frame.next = expected(0)
+    load.next = bool(1)
+    yield clk.negedge
+    load.next = bool(0)
+
+    for frame in range(num_frames):
+      yield clk.negedge
+      yield clk.negedge
+      assert int(next_frame) == expected(frame), '%s: %s' % (frame, IrigFrame(int(next_frame), nbits=num_bits))
+
+      # pps is a few cycles long, frame_latched is one cycle
+      pulse = pps if pps_sync else frame_latched
+      pulse.next = bool(1)
+      yield clk.negedge
+      if pps_sync:
+        frame_latched.next = bool(1)  # ignored with pps_sync
+        yield clk.negedge
+        frame_latched.next = bool(0)
+      pulse.next = bool(0)
+
+    raise StopSimulation
+
+  return dut, clkgen, stimulus
+
+def loopback_bench(start, num_frames):
+  """ The counter drives IrigTTLEncoder, and IrigTTLDecoder decodes consecutive times """
+  rst = ResetSignal(0, active=1, isasync=True)
+  frame_latched, load, pps, ttl, frame_valid, enable, clk = [Signal(bool(0)) for i in range(7)]
+  next_frame, load_frame, frame_out = [Signal(intbv(0)[100:]) for i in range(3)]
+  control = Signal(intbv(0)[18:])
+
+  counter = hardware.IrigTimeCounter(next_frame, frame_latched, load, load_frame, control, pps, clk, rst)
+  encoder = hardware.IrigTTLEncoder(next_frame, frame_latched, ttl, enable, clk, rst)
+  decoder = hardware.IrigTTLDecoder(ttl, frame_out, frame_valid, enable, clk, rst)
+
+  @always(delay(PERIOD//2))
+  def clkgen():
+    clk.next = not clk
+
+  @instance
+  def monitor():
+    for frame in range(num_frames):
+      yield frame_valid.posedge
+      yield clk.negedge
+      assert IrigFrame.from_intbv(frame_out).to_irigtime() == start + timedelta(seconds=frame)
+    raise StopSimulation
+
+  @instance
+  def stimulus():
+    rst.next = bool(1)
+    yield clk.negedge
+    rst.next = bool(0)
+    load_frame.next = IrigFrame.from_irigtime(start).to_intbv()
+    load.next = bool(1)
+    yield clk.negedge
+    load.next = bool(0)
+    enable.next = bool(1)
+
+  return counter, encoder, decoder, clkgen, monitor, stimulus
+
+def run(*args, **kwargs):
+  sim = Simulation(bench(*args, **kwargs))
+  sim.run(quiet=1)
+
+def test_new_year():
+  run(irigtime(2016, 12, 31, 23, 59, 50), 20)
+
+def test_leap_day():
+  run(irigtime(2016, 2, 28, 23, 59, 58), 4)
+  run(irigtime(2017, 2, 28, 23, 59, 58), 4)
+
+def test_random_times():
+  random.seed(1)
+  for i in range(20):
+    run(irigtime(2000, 1, 1) + timedelta(seconds=random.randrange(100 * 365 * 86400)), 3)
+
+def test_irig_a():
+  run(irigtime(2016, 7, 20, 1, 49, 59), 25, frames_per_second=10)
+
+def test_irig_e():
+  run(irigtime(2016, 12, 31, 23, 58), 20, seconds_per_frame=10)
+
+def test_irig_h():
+  run(irigtime(2016, 12, 31, 22, 0), 150, num_bits=60, seconds_per_frame=60)
+
+def test_irig_d():
+  # Through the end of 2015 and February 29th 2016
+  run(irigtime(2015, 12, 30), 1500, num_bits=60, seconds_per_frame=3600)
+
+def test_pps_sync():
+  run(irigtime(2016, 12, 31, 23, 59, 58), 5, pps_sync=True)
+
+def test_pps_sync_irig_e():
+  run(irigtime(2016, 12, 31, 23, 59, 55), 8, seconds_per_frame=10, pps_sync=True)
+
+def test_loopback():
+  sim = Simulation(loopback_bench(irigtime(2016, 12, 31, 23, 59, 58), 4))
+  sim.run(quiet=1)
+
+if __name__ == '__main__':
+  test_new_year()
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+import numpy as np
+from irig.corpus import frame_codes, render_frames
+from irig.decode import AnalogDecoder, DigitalDecoder, _SBS_POSITIONS, demodulate_digital
+from irig.render import encode_range
+from irig.utilities import irigtime
+
+START = irigtime(2016, 7, 20, 1, 49)
+
+def feed(decoder, signal, blocks):
+  """ Feeds signal in blocks, returns the frames and edges decoded """
+  frames, edges = [], []
+  for block in np.array_split(signal, blocks):
+    frames += decoder.feed(block)
+    edges += decoder.edges
+  return frames, edges
+
+def test_analog_silent_lead_in():
+  # Sound cards often open before the signal arrives
+  signal = encode_range(START, 10, kind='analog', flat=True)
+  for lead in (0, 16000, 32000):
+    frames, _ = feed(AnalogDecoder(), np.concatenate((np.zeros(lead), signal)), 40)
+    assert frames == [START + timedelta(seconds=s) for s in range(1, 10)], lead
+
+def test_tracking_control():
+  signal = encode_range(START, 20, flat=True, control=5)
+  decoder = DigitalDecoder()
+  frames, _ = feed(decoder, signal, 40)
+  assert frames == [START + timedelta(seconds=s) for s in range(1, 20)]
+  assert (decoder.tracked, decoder.mispredictions) == (18, 0)
+
+def test_tracking_without_sbs():
+  times = np.datetime64('2016-07-20T01:49:00') + np.arange(20)
+  codes = frame_codes(times)
+  codes[:, _SBS_POSITIONS] = 0
+  decoder = DigitalDecoder()
+  frames, _ = feed(decoder, render_frames(codes).ravel(), 40)
+  assert frames == [START + timedelta(seconds=s) for s in range(1, 20)]
+  assert (decoder.tracked, decoder.mispredictions) == (18, 0)
+
+def test_array_levels():
+  signal = encode_range(START, 1, flat=True) * 5
+  expected = demodulate_digital(signal, levels=(0, 5))
+  for levels in (np.array([0, 5]), [0, 5]):
+    starts, codes, confidence = demodulate_digital(signal, levels=levels)
+    assert np.array_equal(starts, expected[0]) and np.array_equal(codes, expected[1])
+
+def test_block_size():
+  for decoder, signal in ((DigitalDecoder, encode_range(START, 5, flat=True)),
+                          (AnalogDecoder, encode_range(START, 5, 'analog').ravel())):
+    expected = feed(decoder(), signal, 1)
+    for blocks in (7, 50, 333):
+      frames, edges = feed(decoder(), signal, blocks)
+      assert frames == expected[0] and np.allclose(edges, expected[1]), (decoder, blocks)
+    assert expected[0] == [START + timedelta(seconds=s) for s in range(1, 5)]
@@ -0,0 +1,28 @@
+import numpy as np
+
+from irig.formats import FORMATS
+from irig.realtime import RealtimeSource
+from irig.utilities import irigtime
+
+
+def run(source, start, frames):
+  """Play frames in half frame blocks with a clock that follows the samples"""
+  block = np.empty(source.timecode.frame_length(source.kind) // 2, dtype=source.dtype)
+  for i in range(2 * frames):
+    source.fill(block, now=start + i * len(block) / source.rate)
+    source.prepare()
+
+
+def test_epoch_does_not_drift():
+  source = RealtimeSource(kind='digital', timecode=FORMATS['A'], latency=0)
+  run(source, 1469000000.0, 20000)  # 2000 s of 0.1 s frames
+  assert source.frame_time == irigtime(2016, 7, 20, 8, 6, 40)
+  assert abs(source.edge_error) < 1e-6
+  assert (source.slipped, source.stuffed, source.underruns) == (0, 0, 0)
+
+
+def test_sub_second_start():
+  source = RealtimeSource(kind='digital', timecode=FORMATS['A'], latency=0)
+  run(source, 1469000000.35, 1)
+  assert source.frame_time == irigtime(2016, 7, 20, 7, 33, 20, 400000)
+  assert round(source.edge_error, 6) == 0
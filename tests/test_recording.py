@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import irig.recording
+from irig.recording import read_signal, write_signal
+from irig.render import encode_range
+from irig.utilities import irigtime
+
+START = irigtime(2016, 7, 20, 1, 49)
+
+
+def test_wav_dtype(tmp_path):
+  path = str(tmp_path / 'irig.wav')
+  with pytest.raises(ValueError):
+    write_signal(path, START, 2, dtype='uint8')
+  assert not (tmp_path / 'irig.wav').exists()
+
+  write_signal(path, START, 2, dtype='int16')
+  with pytest.raises(ValueError):
+    write_signal(path, START, 1, dtype='uint8', frame_offset='end')
+  assert len(read_signal(path)[0]) == 2 * 32000
+
+
+def test_interrupted_wav(tmp_path, monkeypatch):
+  path = str(tmp_path / 'irig.wav')
+  blocks = []
+
+  def interrupted(*args, **kwargs):
+    if len(blocks) == 2:
+      raise KeyboardInterrupt
+    blocks.append(args[0])
+    return encode_range(*args, **kwargs)
+
+  monkeypatch.setattr(irig.recording, 'encode_range', interrupted)
+  with pytest.raises(KeyboardInterrupt):
+    write_signal(path, START, 5, dtype='int16', block_samples=32000)
+  signal, rate = read_signal(path)
+  assert (len(signal), rate) == (2 * 32000, 32000)
+
+  monkeypatch.undo()
+  assert write_signal(path, START, 3, dtype='int16', frame_offset='end') == 5
+  expected = encode_range(START, 5, 'analog', 'int16')
+  assert np.array_equal(read_signal(path)[0], expected.ravel())